@@ -1,7 +1,9 @@
+import functools
 import os
+import threading
 from dotenv import load_dotenv
 from redis import Redis
-from qdrant_client import QdrantClient
+from redis.asyncio import Redis as AsyncRedis
 
 load_dotenv()
 
@@ -9,13 +11,175 @@ load_dotenv()
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", "")
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"  # use gRPC transport for data operations
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 
-# Initialize Clients
-redis_client = Redis.from_url(REDIS_URL, decode_responses=True)
+# Streaming
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))  # idle interval before a keep-alive comment is sent
+# "streams" keeps a replayable per-conversation log (XADD/XREAD); "pubsub" is fire-and-forget
+EVENT_BACKEND = os.getenv("EVENT_BACKEND", "streams").lower()
+EVENT_STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", "5000"))  # approximate cap on entries kept per conversation
+EVENT_STREAM_TTL_SECONDS = int(os.getenv("EVENT_STREAM_TTL_SECONDS", "3600"))  # idle conversations' logs expire after this
+# text_delta coalescing: buffered fragments are published once either limit is reached
+DELTA_FLUSH_MS = int(os.getenv("DELTA_FLUSH_MS", "50"))
+DELTA_FLUSH_CHARS = int(os.getenv("DELTA_FLUSH_CHARS", "200"))
 
-qdrant_client = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY,
-)
+# Embedding model backend: "torch" (fp32 PyTorch) or "onnx" (ONNX Runtime, int8-quantized file by default)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Local directory or hub id holding the ONNX export, and the file inside it to load
+EMBEDDING_ONNX_MODEL_PATH = os.getenv("EMBEDDING_ONNX_MODEL_PATH", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
 
-print(qdrant_client.get_collections())
+# Query embedding micro-batching
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))  # max queries encoded in one call
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))  # how long the first query waits for company
+
+# Batch query endpoint (/query/batch)
+QUERY_BATCH_MAX_QUERIES = int(os.getenv("QUERY_BATCH_MAX_QUERIES", "1000"))  # questions accepted per request
+QUERY_BATCH_LLM_CONCURRENCY = int(os.getenv("QUERY_BATCH_LLM_CONCURRENCY", "8"))  # LLM generations in flight at once, across batch requests
+
+# Query embedding cache (in-process LRU in front of Redis)
+EMBED_CACHE_LRU_SIZE = int(os.getenv("EMBED_CACHE_LRU_SIZE", "10000"))  # entries kept per process
+EMBED_CACHE_TTL_SECONDS = int(os.getenv("EMBED_CACHE_TTL_SECONDS", "86400"))  # Redis tier expiry
+# Chunk embedding cache used by ingestion; 0 disables expiry
+EMBED_CHUNK_CACHE_TTL_SECONDS = int(os.getenv("EMBED_CHUNK_CACHE_TTL_SECONDS", str(30 * 86400)))
+
+# Semantic answer cache (replays answers for near-duplicate questions)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # cosine similarity needed for a hit
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "1800"))
+
+# PDF ingestion pipeline (extract -> embed -> upsert run concurrently)
+PDF_EMBED_BATCH_SIZE = int(os.getenv("PDF_EMBED_BATCH_SIZE", "64"))  # chunks per encode call, across page boundaries
+PDF_PIPELINE_QUEUE_SIZE = int(os.getenv("PDF_PIPELINE_QUEUE_SIZE", "8"))  # max items buffered between stages
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "4"))  # processes for parallel page extraction; 1 disables it
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))  # smaller files are extracted serially
+
+# URL crawling (ingestion workers fetch claimed URL jobs' pages concurrently)
+CRAWL_MAX_CONCURRENCY = int(os.getenv("CRAWL_MAX_CONCURRENCY", "32"))  # requests in flight across all hosts
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "4"))  # requests in flight per host
+CRAWL_TIMEOUT_SECONDS = float(os.getenv("CRAWL_TIMEOUT_SECONDS", "10"))  # per-request timeout
+CRAWL_MAX_BYTES = int(os.getenv("CRAWL_MAX_BYTES", str(5 * 1024 * 1024)))  # larger responses are abandoned
+CRAWL_BATCH_SIZE = int(os.getenv("CRAWL_BATCH_SIZE", "16"))  # URL jobs an ingestion worker claims and fetches together
+
+# HTML text extraction engine: "lxml" (C parser, fast) or "bs4" (BeautifulSoup html.parser)
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "lxml").lower()
+
+# Ingestion queue / worker pool
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))  # worker processes started by the ingestion worker
+INGEST_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("INGEST_VISIBILITY_TIMEOUT_SECONDS", "300"))  # claimed jobs without a heartbeat for this long are re-queued
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))  # attempts before a job goes to the dead-letter list
+INGEST_RETRY_BACKOFF_SECONDS = float(os.getenv("INGEST_RETRY_BACKOFF_SECONDS", "5"))  # base delay, doubled per attempt
+
+# Qdrant bulk upserts
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))  # points per upsert request
+QDRANT_UPSERT_PARALLELISM = int(os.getenv("QDRANT_UPSERT_PARALLELISM", "4"))  # upsert requests in flight at once
+QDRANT_UPSERT_WAIT = os.getenv("QDRANT_UPSERT_WAIT", "false").lower() == "true"  # false: don't block on indexing, confirm with a barrier at the end
+QDRANT_BARRIER_TIMEOUT_SECONDS = float(os.getenv("QDRANT_BARRIER_TIMEOUT_SECONDS", "120"))
+
+# Vector store backend: "qdrant" (server) or "local" (embedded memory-mapped index, no server needed)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "qdrant").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "./data/vector_index")  # one subdirectory per collection
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32").lower()  # "float16" halves the file but search is ~5x slower (CPU upcasts each block)
+
+# Qdrant collection layout (applied only when the collection is first created)
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))  # graph edges per node; higher = better recall, more memory
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "128"))  # build-time candidate list size
+QDRANT_SCALAR_QUANTIZATION = os.getenv("QDRANT_SCALAR_QUANTIZATION", "false").lower() == "true"  # int8 copies of the vectors kept in RAM
+QDRANT_ON_DISK_PAYLOAD = os.getenv("QDRANT_ON_DISK_PAYLOAD", "true").lower() == "true"  # keep payloads (chunk text) out of RAM
+# Qdrant search
+QDRANT_SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "128"))  # search-time candidate list size; 0 uses the server default
+QDRANT_SEARCH_RESCORE = os.getenv("QDRANT_SEARCH_RESCORE", "true").lower() == "true"  # re-rank quantized hits with the original vectors
+QDRANT_SEARCH_OVERSAMPLING = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", "2.0"))  # quantized candidates fetched per requested hit
+
+# Hybrid retrieval: BM25-weighted sparse vectors (in a companion "<collection>_sparse"
+# Qdrant collection) searched alongside the dense vectors and merged with reciprocal rank fusion
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # hits fetched per leg before fusion
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))  # RRF damping constant: score = sum(1 / (k + rank))
+HYBRID_LEXICAL_BYPASS_RANKS = int(os.getenv("HYBRID_LEXICAL_BYPASS_RANKS", "3"))  # top lexical hits kept even below the dense similarity floor
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))  # term-frequency saturation
+BM25_B = float(os.getenv("BM25_B", "0.75"))  # chunk length normalization
+BM25_AVG_CHUNK_TOKENS = float(os.getenv("BM25_AVG_CHUNK_TOKENS", "350"))  # assumed average chunk length in tokens (~400-word URL chunks, 2000-char PDF chunks)
+
+# Maximal Marginal Relevance: trade relevance against redundancy when choosing citations
+MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))  # 1.0 = pure relevance order, lower = more diverse
+MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", "20"))  # hits retrieved for MMR to choose MAX_CITATIONS from
+
+# Prompt context packing for generate_answer
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # tokens of retrieved context per prompt
+CONTEXT_MIN_SNIPPET_TOKENS = int(os.getenv("CONTEXT_MIN_SNIPPET_TOKENS", "60"))  # don't add a trimmed snippet shorter than this
+TOKEN_ESTIMATE_CHARS_PER_TOKEN = float(os.getenv("TOKEN_ESTIMATE_CHARS_PER_TOKEN", "4.0"))  # starting ratio; recalibrated from the LLM's reported counts
+
+# Cross-encoder reranking of retrieved candidates (optional)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))  # hits retrieved for reranking; the top MAX_CITATIONS are kept
+RERANK_CACHE_TTL_SECONDS = int(os.getenv("RERANK_CACHE_TTL_SECONDS", "3600"))  # Redis expiry of cached (query, chunk) scores
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "250"))  # per-turn latency budget for the rerank stage
+RERANK_MAX_OVER_BUDGET = int(os.getenv("RERANK_MAX_OVER_BUDGET", "3"))  # consecutive over-budget turns before it switches itself off
+RERANK_COOLDOWN_SECONDS = float(os.getenv("RERANK_COOLDOWN_SECONDS", "300"))  # how long it stays off before being tried again
+
+# Clients are created on first use rather than at import, so the API process
+# starts fast and doesn't fail to import when a dependency is down
+def lazy_singleton(factory):
+    """Wrap a zero-arg factory into a thread-safe accessor that builds its value once.
+
+    A factory that raises leaves nothing cached, so the next call retries.
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def accessor():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    accessor.is_initialized = lambda: bool(instance)
+    return accessor
+
+
+@lazy_singleton
+def get_redis():
+    return Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+@lazy_singleton
+def get_redis_bytes():
+    """Raw-bytes client for binary values (e.g. float32 vectors) that must not be utf-8 decoded."""
+    return Redis.from_url(REDIS_URL)
+
+
+@lazy_singleton
+def get_async_redis():
+    """asyncio client used by the SSE endpoints so open streams don't pin threadpool threads."""
+    return AsyncRedis.from_url(REDIS_URL, decode_responses=True)
+
+
+@lazy_singleton
+def get_qdrant():
+    # qdrant_client's import alone takes over a second; the API only needs it on first search
+    from qdrant_client import QdrantClient
+
+    return QdrantClient(
+        url=QDRANT_URL,
+        api_key=QDRANT_API_KEY,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        grpc_port=QDRANT_GRPC_PORT,
+    )
+
+
+@lazy_singleton
+def get_search_params():
+    """SearchParams passed with every vector search (hnsw_ef, quantization rescoring)."""
+    from qdrant_client.models import SearchParams, QuantizationSearchParams
+
+    quantization = None
+    if QDRANT_SCALAR_QUANTIZATION:
+        quantization = QuantizationSearchParams(rescore=QDRANT_SEARCH_RESCORE, oversampling=QDRANT_SEARCH_OVERSAMPLING)
+    return SearchParams(hnsw_ef=QDRANT_SEARCH_HNSW_EF or None, quantization=quantization)
@@ -1,10 +1,60 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
-from app.routes import ingest, query, chat, conversations
-from app.config import redis_client, qdrant_client
+import threading
+import time
+from app.routes import ingest, query, chat, conversations, stats
+from app.config import get_redis, VECTOR_STORE_BACKEND
+from app.utils.vectorstore import get_vector_store
+from app.utils.embeddings import warmup as warmup_embeddings
+from app.utils.llm import get_genai_client
+from app.utils.reranker import reranker
+from app.utils.supabase_client import get_supabase
 
-app = FastAPI(title="Scalable Web-Aware RAG Engine (Prototype)")
+# Filled in by the warmup thread; /ready reports from it
+warmup_state = {"done": False, "error": None, "seconds": None, "attempts": 0}
+WARMUP_RETRY_MAX_SECONDS = 60  # cap on the backoff between failed warmup attempts
+
+
+def run_warmup():
+    """Load the embedding model and build the clients so requests don't pay for it.
+
+    Retries with exponential backoff until it succeeds, so a transient failure
+    (model download, Supabase or GenAI unreachable) doesn't leave /ready at 503.
+    The lazy accessors cache nothing on failure, so each attempt starts clean.
+    """
+    start = time.perf_counter()
+    delay = 1.0
+    while True:
+        warmup_state["attempts"] += 1
+        try:
+            warmup_embeddings()
+            reranker.warmup()
+            get_supabase()
+            get_genai_client()
+            warmup_state["done"] = True
+            warmup_state["error"] = None
+            print(f"[Startup] Warmup finished in {time.perf_counter() - start:.2f}s")
+            break
+        except Exception as e:
+            warmup_state["error"] = str(e)
+            print(f"[Startup] Warmup attempt {warmup_state['attempts']} failed: {e}; retrying in {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+    warmup_state["seconds"] = round(time.perf_counter() - start, 2)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background: the server starts accepting requests (and
+    # answering /health) immediately, while /ready stays 503 until it's done
+    threading.Thread(target=run_warmup, name="warmup", daemon=True).start()
+    yield
+
+
+app = FastAPI(title="Scalable Web-Aware RAG Engine (Prototype)", lifespan=lifespan)
 
 # CORS: allow ALL origins. Note: allowing credentials with a wildcard origin is
 # not allowed by browsers; this configuration permits all origins but disables
@@ -20,26 +70,36 @@ app.add_middleware(
 
 @app.get("/health")
 async def health_check():
-    """Verify Redis and Qdrant connections."""
+    """Verify Redis and vector store (Qdrant or the local index) connections."""
     try:
-        redis_ok = redis_client.ping()
+        redis_ok = get_redis().ping()
     except Exception:
         redis_ok = False
 
     try:
-        qdrant_info = qdrant_client.get_collections()
-        qdrant_ok = True
+        qdrant_ok = bool(get_vector_store().healthy())
     except Exception:
         qdrant_ok = False
 
     return {
         "status": "ok" if (redis_ok and qdrant_ok) else "partial",
         "redis": redis_ok,
-        "qdrant": qdrant_ok
+        "qdrant": qdrant_ok,
+        "vector_store": VECTOR_STORE_BACKEND,
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until warmup has loaded the embedding model."""
+    body = {"ready": warmup_state["done"], "warmup_seconds": warmup_state["seconds"]}
+    if warmup_state["error"]:
+        body["error"] = warmup_state["error"]
+        body["warmup_attempts"] = warmup_state["attempts"]
+    return JSONResponse(status_code=200 if warmup_state["done"] else 503, content=body)
+
 # Include routes
 app.include_router(query.router)
 app.include_router(ingest.router)
 app.include_router(chat.router)
-app.include_router(conversations.router)
\ No newline at end of file
+app.include_router(conversations.router)
+app.include_router(stats.router)
\ No newline at end of file
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uuid
-import json
-from app.utils.supabase_client import supabase
-from app.config import redis_client
+from app.utils.supabase_client import get_supabase
+from app.config import get_redis, EVENT_BACKEND
 from app.utils.orchestrator import Orchestrator
 from app.utils.llm import generate_response
+from app.utils.sse import pubsub_event_stream, redis_stream_events
+from app.utils.conversation_scope import resolve_scope
 
 router = APIRouter()
 
@@ -13,6 +15,9 @@ router = APIRouter()
 class ChatRequest(BaseModel):
     conversation_id: str | None = None
     message: str
+    # Restrict retrieval to these documents for this and later turns of the
+    # conversation; omit to keep the current scope, [] to search everything
+    doc_ids: list[str] | None = None
 
 
 @router.post("/chat")
@@ -21,6 +26,12 @@ async def start_chat(payload: ChatRequest, background_tasks: BackgroundTasks):
     if not message_text:
         raise HTTPException(status_code=400, detail="Message text missing")
 
+    # Resolve the retrieval scope first, so an invalid one doesn't create a conversation
+    try:
+        doc_ids = resolve_scope(payload.conversation_id, payload.doc_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Create conversation if needed
     if payload.conversation_id:
         conversation_id = payload.conversation_id
@@ -33,84 +44,52 @@ async def start_chat(payload: ChatRequest, background_tasks: BackgroundTasks):
             ai_title = ai_title.strip().split("\n")[0][:48]
         except Exception:
             ai_title = message_text[:32]
-        supabase.table("conversations").insert({
+        get_supabase().table("conversations").insert({
             "conversation_id": conversation_id,
             "title": ai_title
         }).execute()
 
-    # Insert user message
+    # Insert user message; its metadata persists the conversation's scope for later turns
     message_id = str(uuid.uuid4())
-    supabase.table("messages").insert({
+    get_supabase().table("messages").insert({
         "message_id": message_id,
         "conversation_id": conversation_id,
         "role": "user",
         "content": message_text,
-        "metadata": {}
+        "metadata": {"doc_ids": doc_ids} if doc_ids else {}
     }).execute()
 
     # Kick off orchestrator in background to generate streaming response
-    orchestrator = Orchestrator(redis_client)
-    background_tasks.add_task(orchestrator.run, conversation_id, message_text)
+    orchestrator = Orchestrator(get_redis())
+    orchestrator.begin_turn(conversation_id)
+    background_tasks.add_task(orchestrator.run, conversation_id, message_text, doc_ids)
 
-    return {"conversation_id": conversation_id, "message_id": message_id}
+    return {"conversation_id": conversation_id, "message_id": message_id, "doc_ids": doc_ids}
 
 
 @router.get("/chat/{conversation_id}/stream")
-async def stream_chat(conversation_id: str):
-    """SSE endpoint that streams events published to Redis channel for the conversation.
+async def stream_chat(
+    conversation_id: str,
+    last_event_id: str | None = None,
+    last_event_id_header: str | None = Header(default=None, alias="Last-Event-ID"),
+):
+    """SSE endpoint that streams events published to Redis for the conversation.
 
     Events are expected to be JSON objects with keys: type, data.
-    """
-    from fastapi.responses import StreamingResponse
-    import time
+    The stream is served from an async generator on `redis.asyncio`, so each open
+    connection is a coroutine rather than a blocked worker thread.
 
-    pubsub = redis_client.pubsub()
-    channel = f"conversation:{conversation_id}"
-    pubsub.subscribe(channel)
-    # Mark subscriber flag so orchestrator can detect a connected client
-    sub_flag_key = f"conversation:{conversation_id}:subscribed"
-    try:
-        redis_client.set(sub_flag_key, "1", ex=30)
-    except Exception:
-        pass
-
-    def event_generator():
-        try:
-            for message in pubsub.listen():
-                # message is a dict with 'type' and 'data'
-                if not message:
-                    continue
-                if message.get("type") == "message":
-                    raw = message.get("data")
-                    if isinstance(raw, bytes):
-                        raw = raw.decode("utf-8")
-                    # Each published payload should be a JSON string
-                    try:
-                        payload = json.loads(raw)
-                    except Exception:
-                        payload = {"type": "unknown", "data": raw}
-
-                    # Format as SSE: event: <type>\ndata: <json>\n\n
-                    event_type = payload.get("type", "message")
-                    data = payload.get("data", {})
-                    s = f"event: {event_type}\n"
-                    s += "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
-                    yield s
-
-                    # Stop streaming if done event is received
-                    if event_type == "done":
-                        break
-                time.sleep(0.01)
-        finally:
-            try:
-                # Unset subscriber flag and cleanup
-                try:
-                    redis_client.delete(sub_flag_key)
-                except Exception:
-                    pass
-                pubsub.unsubscribe(channel)
-                pubsub.close()
-            except Exception:
-                pass
-
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    With the streams backend, clients resume from `Last-Event-ID` (sent
+    automatically by EventSource on reconnect, or via the `last_event_id`
+    query parameter).
+    """
+    if EVENT_BACKEND == "streams":
+        events = redis_stream_events(conversation_id, last_event_id_header or last_event_id)
+    else:
+        events = pubsub_event_stream(conversation_id)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Disable proxy buffering (nginx) and caching so frames are flushed immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
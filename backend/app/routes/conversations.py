@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
-from app.utils.supabase_client import supabase
+from app.utils.supabase_client import get_supabase
+from app.utils.conversation_scope import scope_from_messages
 
 router = APIRouter()
 
@@ -8,7 +9,7 @@ router = APIRouter()
 async def list_conversations():
     """Return a list of conversations (id, title, created_at)."""
     try:
-        res = supabase.table("conversations").select("conversation_id, title, created_at").order("created_at", desc=True).execute()
+        res = get_supabase().table("conversations").select("conversation_id, title, created_at").order("created_at", desc=True).execute()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Supabase query failed: {e}")
 
@@ -24,10 +25,10 @@ async def get_conversation_history(conversation_id: str):
     """
     try:
         # supabase-py/Postgrest order() expects the second parameter as a keyword (ascending=True)
-        res = supabase.table("messages").select("message_id,role,content,metadata,created_at").eq("conversation_id", conversation_id).order("created_at").execute()
+        res = get_supabase().table("messages").select("message_id,role,content,metadata,created_at").eq("conversation_id", conversation_id).order("created_at").execute()
     except Exception as e:
         print(f"Supabase query failed: {e}")
         raise HTTPException(status_code=500, detail=f"Supabase query failed: {e}")
 
     data = res.data or []
-    return {"conversation_id": conversation_id, "messages": data}
+    return {"conversation_id": conversation_id, "messages": data, "doc_ids": scope_from_messages(data)}
@@ -2,32 +2,48 @@ from fastapi import APIRouter, HTTPException, UploadFile, File
 from fastapi.responses import FileResponse, RedirectResponse
 from pydantic import BaseModel, HttpUrl
 import uuid
-import json
 import os
+import asyncio
+import hashlib
 from pathlib import Path
 import urllib.parse
 import urllib.request
-from app.config import redis_client
-from app.utils.supabase_client import supabase
+from app.utils.supabase_client import get_supabase
+from app.workers.job_queue import enqueue_job
 
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # bytes read from the upload and written to disk per step
+
 
 class IngestURLRequest(BaseModel):
     url: HttpUrl
     source: str = "web"
+    # Re-crawl an already ingested URL; only changed chunks are re-embedded
+    refresh: bool = False
 
 
 @router.post("/ingest-url", status_code=202)
 async def ingest_url(payload: IngestURLRequest):
-    """Accept a URL, create a job, and enqueue it for ingestion."""
+    """Accept a URL, create a job, and enqueue it for ingestion.
+
+    With `refresh`, an already completed URL is queued for a conditional,
+    incremental re-crawl instead of being rejected.
+    """
 
     # Check if URL is already ingested
     try:
-        existing = supabase.table("documents").select("doc_id", "status").eq("url", str(payload.url)).execute()
+        existing = get_supabase().table("documents").select("doc_id", "status").eq("url", str(payload.url)).execute()
         if existing.data and len(existing.data) > 0:
             doc = existing.data[0]
-            if doc["status"] == "completed":
+            if doc["status"] == "completed" and payload.refresh:
+                job_id = str(uuid.uuid4())
+                try:
+                    enqueue_job({"job_id": job_id, "doc_id": doc["doc_id"], "url": str(payload.url), "refresh": True})
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=f"Redis enqueue failed: {e}")
+                return {"message": "URL refresh queued", "job_id": job_id, "doc_id": doc["doc_id"]}
+            elif doc["status"] == "completed":
                 return {"message": "URL already ingested", "doc_id": doc["doc_id"]}
             elif doc["status"] == "processing":
                 return {"message": "URL ingestion already in progress", "doc_id": doc["doc_id"]}
@@ -39,13 +55,15 @@ async def ingest_url(payload: IngestURLRequest):
             # URL is not ingested, create a new job
             doc_id = str(uuid.uuid4())
 
-            supabase.table("documents").insert({
+            get_supabase().table("documents").insert({
                 "doc_id": doc_id,
                 "url": str(payload.url),
                 "source": payload.source,
                 "status": "pending"
             }).execute()
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Supabase query failed: {e}")
 
@@ -59,13 +77,13 @@ async def ingest_url(payload: IngestURLRequest):
 
     # Push to Redis queue
     try:
-        redis_client.rpush("ingest:jobs", json.dumps(job_payload))
+        enqueue_job(job_payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Redis enqueue failed: {e}")
 
     # Update document status to 'queued'
     try:
-        supabase.table("documents").update({"status": "queued"}).eq("doc_id", doc_id).execute()
+        get_supabase().table("documents").update({"status": "queued"}).eq("doc_id", doc_id).execute()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Supabase update failed: {e}")
 
@@ -77,7 +95,10 @@ async def ingest_url(payload: IngestURLRequest):
 async def upload_pdf(file: UploadFile = File(...)):
     """Accept a PDF upload and queue it for page-aware ingestion.
 
-    Saves file to ./data/uploads/{doc_id}.pdf and enqueues a job with file_path.
+    Streams the upload to ./data/uploads/{doc_id}.pdf in chunks while hashing
+    it, and enqueues a job with file_path. If a document with the same content
+    hash already exists (and didn't fail), its doc_id is returned instead and
+    no ingestion job is queued.
     """
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF uploads are supported")
@@ -88,22 +109,46 @@ async def upload_pdf(file: UploadFile = File(...)):
 
     doc_id = str(uuid.uuid4())
     dest_path = base_dir / f"{doc_id}.pdf"
+    tmp_path = base_dir / f"{doc_id}.part"
 
+    hasher = hashlib.sha256()
     try:
-        with open(dest_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
     except Exception as e:
+        tmp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"Failed to save uploaded file: {e}")
+    content_hash = hasher.hexdigest()
+
+    # Same bytes already uploaded: reuse that document instead of re-ingesting it
+    try:
+        existing = get_supabase().table("documents").select("doc_id", "status", "url").eq("content_hash", content_hash).execute()
+    except Exception as e:
+        tmp_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Supabase query failed: {e}")
+
+    reusable = [d for d in (existing.data or []) if d.get("status") != "failed"]
+    if reusable:
+        tmp_path.unlink(missing_ok=True)
+        doc = reusable[0]
+        return {"message": "Document already uploaded", "doc_id": doc["doc_id"], "url": doc.get("url"), "duplicate": True}
+
+    os.replace(tmp_path, dest_path)
 
     # Insert document record
     try:
-        supabase.table("documents").insert({
+        get_supabase().table("documents").insert({
             "doc_id": doc_id,
             "url": dest_path.as_uri(),
             "source": "upload",
             "status": "queued",
-            "file_name": file.filename
+            "file_name": file.filename,
+            "content_hash": content_hash
         }).execute()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Supabase insert failed: {e}")
@@ -117,7 +162,7 @@ async def upload_pdf(file: UploadFile = File(...)):
     }
 
     try:
-        redis_client.rpush("ingest:jobs", json.dumps(job_payload))
+        enqueue_job(job_payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Redis enqueue failed: {e}")
 
@@ -140,7 +185,7 @@ async def get_document_pdf(doc_id: str):
 
     # 2) Query Supabase for the document record
     try:
-        res = supabase.table("documents").select("url", "file_name").eq("doc_id", doc_id).execute()
+        res = get_supabase().table("documents").select("url", "file_name").eq("doc_id", doc_id).execute()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Supabase query failed: {e}")
 
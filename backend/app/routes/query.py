@@ -15,19 +15,72 @@
 #     return {"response": result}
 
 
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from app.utils.llm import generate_response
-from app.utils.embeddings import embed_texts
-from app.utils.vectorstore import qdrant_client
+from app.utils.embeddings import embed_query_async, embed_queries
+from app.utils.vectorstore import search_vectors, search_vectors_batch
+from app.utils.conversation_scope import validate_doc_ids
+from app.config import QUERY_BATCH_MAX_QUERIES, QUERY_BATCH_LLM_CONCURRENCY
 
 router = APIRouter()
 
 COLLECTION_NAME = "documents_chunks"
 TOP_K = 5  # number of chunks to retrieve
+SEARCH_LIMIT = 10  # hits fetched per query; the top 3 go into the prompt
+
+# Caps LLM calls made for /query/batch, shared by all batch requests
+_batch_llm_pool = ThreadPoolExecutor(max_workers=QUERY_BATCH_LLM_CONCURRENCY, thread_name_prefix="batch-llm")
 
 class QueryRequest(BaseModel):
     query: str
+    doc_ids: list[str] | None = None  # optional: only search these documents
+
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str]
+    doc_ids: list[str] | None = None  # optional: only search these documents
+
+
+def checked_doc_ids(doc_ids):
+    """Validated doc_ids filter (None = all documents); unknown ids are a 400."""
+    if not doc_ids:
+        return None
+    try:
+        return validate_doc_ids(doc_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def build_prompt(user_query, search_result):
+    """Return (prompt, unique source URLs) for a query and its search hits."""
+    context_texts = []
+    sources = []
+    for hit in search_result:
+        payload = hit.payload
+        # URL chunks store their text as "text_snippet", PDF chunks as "text"
+        snippet = payload.get("text") or payload.get("text_snippet") or ""
+        url = payload.get("url", "")
+        context_texts.append(snippet)
+        sources.append(url)
+
+    context = "\n\n".join(context_texts[:3]) # use top 3 chunks 
+
+    prompt = f"""
+            You are an assistant that answers questions using the provided context.
+            If the context does not contain enough information, answer based on your general knowledge.
+            Context:
+            {context}
+
+            Question: {user_query}
+
+            Answer:
+            """
+    return prompt, list(set(sources))  # unique URLs
 
 
 @router.post("/query")
@@ -35,45 +88,20 @@ async def query_endpoint(payload: QueryRequest):
     user_query = payload.query.strip()
     if not user_query:
         raise HTTPException(status_code=400, detail="Query text missing")
+    doc_ids = checked_doc_ids(payload.doc_ids)
 
     try:
         # 1️⃣ Embed query
-        query_vector = embed_texts([user_query])[0]
+        query_vector = await embed_query_async(user_query)
 
-        # 2️⃣ Search Qdrant (use query_points for this Qdrant client)
-        search_result = qdrant_client.query_points(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_vector,
-            limit=10,
-            with_payload=True,
-        )
+        # 2️⃣ Search the vector store
+        search_result = search_vectors(COLLECTION_NAME, query_vector, limit=SEARCH_LIMIT, doc_ids=doc_ids)
 
         if not search_result:
             return {"response": "No relevant documents found.", "sources": []}
 
-        # 3️⃣ Assemble context
-        context_texts = []
-        sources = []
-        for hit in search_result:
-            payload = hit.payload
-            snippet = payload.get("text_snippet", "")
-            url = payload.get("url", "")
-            context_texts.append(snippet)
-            sources.append(url)
-
-        context = "\n\n".join(context_texts[:3]) # use top 3 chunks 
-
-        # 4️⃣ Create prompt for LLM
-        prompt = f"""
-            You are an assistant that answers questions using the provided context.
-            If the context does not contain enough information, answer based on your general knowledge.
-            Context:
-            {context}
-
-            Question: {user_query}
-
-            Answer:
-            """
+        # 3️⃣ Assemble context and 4️⃣ create prompt for LLM
+        prompt, sources = build_prompt(user_query, search_result)
 
         print(prompt)
 
@@ -82,8 +110,54 @@ async def query_endpoint(payload: QueryRequest):
 
         return {
             "response": answer,
-            "sources": list(set(sources))  # unique URLs
+            "sources": sources
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RAG query failed: {e}")
+
+
+async def _answer(index, user_query, search_result):
+    if not search_result:
+        return {"index": index, "query": user_query, "response": "No relevant documents found.", "sources": []}
+    prompt, sources = build_prompt(user_query, search_result)
+    loop = asyncio.get_running_loop()
+    answer = await loop.run_in_executor(_batch_llm_pool, generate_response, [{"role": "user", "content": prompt}])
+    return {"index": index, "query": user_query, "response": answer, "sources": sources}
+
+
+async def _stream_answers(queries, results):
+    """Yield one NDJSON line per query as its answer completes (not in request order)."""
+    tasks = [asyncio.create_task(_answer(i, q, hits)) for i, (q, hits) in enumerate(zip(queries, results))]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done, ensure_ascii=False) + "\n"
+    finally:
+        # Client went away: drop generations that haven't started yet
+        for task in tasks:
+            task.cancel()
+
+
+@router.post("/query/batch")
+async def query_batch_endpoint(payload: BatchQueryRequest):
+    """Answer many questions in one call, streamed back as NDJSON.
+
+    All queries are embedded in one encode call and searched in one batched
+    vector store request; LLM generations then run concurrently (at most
+    QUERY_BATCH_LLM_CONCURRENCY at a time) and each result line is written
+    as soon as it completes. Lines carry the query's `index` in the request.
+    """
+    queries = [q.strip() for q in payload.queries]
+    if not queries or not all(queries):
+        raise HTTPException(status_code=400, detail="Query text missing")
+    if len(queries) > QUERY_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX_QUERIES} queries per batch")
+    doc_ids = checked_doc_ids(payload.doc_ids)
+
+    try:
+        vectors = await asyncio.to_thread(embed_queries, queries)
+        results = await asyncio.to_thread(search_vectors_batch, COLLECTION_NAME, vectors, SEARCH_LIMIT, doc_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"RAG batch query failed: {e}")
+
+    return StreamingResponse(_stream_answers(queries, results), media_type="application/x-ndjson")
@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from app.utils.embeddings import query_cache, query_batcher
+from app.utils.answer_cache import answer_cache
+from app.utils.reranker import reranker
+from app.utils.context_packer import token_estimator
+from app.workers.job_queue import queue_stats
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def get_stats():
+    """Return in-process performance counters for this API worker."""
+    try:
+        ingest_queue = queue_stats()
+    except Exception as e:
+        ingest_queue = {"error": str(e)}
+
+    return {
+        "query_embedding_cache": query_cache.stats(),
+        "query_embedding_batcher": query_batcher.stats(),
+        "semantic_answer_cache": answer_cache.stats(),
+        "reranker": reranker.stats(),
+        "token_estimator": token_estimator.stats(),
+        "ingest_queue": ingest_queue,
+    }
@@ -0,0 +1,150 @@
+import threading
+import time
+import numpy as np
+from app.config import (
+    get_redis,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_TTL_SECONDS,
+)
+
+
+def doc_version_key(doc_id: str) -> str:
+    return f"doc:{doc_id}:version"
+
+
+def bump_doc_version(doc_id: str):
+    """Mark a document as (re-)ingested so cached answers citing it are dropped."""
+    try:
+        get_redis().incr(doc_version_key(doc_id))
+    except Exception as e:
+        print(f"[AnswerCache] Warning: failed to bump version for {doc_id}: {e}")
+
+
+class SemanticAnswerCache:
+    """In-process cache of recent answers, matched by query-embedding similarity.
+
+    Each entry keeps the normalized query vector, the answer text, its
+    citation_map and the ingest version of every cited doc_id at the time it
+    was answered. A lookup is one matrix-vector product over all entries; a hit
+    is only served if none of the cited documents has been re-ingested since
+    (versions are read from Redis, so the ingestion worker can invalidate).
+
+    Only answers grounded in at least one citation are cached: a no-context
+    answer has no documents to invalidate it when the corpus changes.
+    Entries remember the document scope they were answered under and only
+    match lookups with the same scope.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = []
+        self._matrix = None  # rebuilt lazily from entries
+        self._lock = threading.Lock()
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def _doc_versions(self, doc_ids):
+        if not doc_ids:
+            return {}
+        values = get_redis().mget([doc_version_key(d) for d in doc_ids])
+        return dict(zip(doc_ids, values))
+
+    @staticmethod
+    def _scope_key(scope):
+        return tuple(sorted(set(scope))) if scope else None
+
+    def _evict(self, indices):
+        drop = set(indices)
+        self._entries = [e for i, e in enumerate(self._entries) if i not in drop]
+        self._matrix = None
+
+    def lookup(self, query_vector, scope=None):
+        """Return the best cached entry above the threshold answered under `scope`, or None."""
+        q = self._normalize(query_vector)
+        scope = self._scope_key(scope)
+        with self._lock:
+            now = time.time()
+            expired = [i for i, e in enumerate(self._entries) if now - e["created"] > self.ttl_seconds]
+            if expired:
+                self._evict(expired)
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix = np.stack([e["vector"] for e in self._entries])
+            sims = self._matrix @ q
+            sims = np.where([e["scope"] == scope for e in self._entries], sims, -np.inf)
+            best = int(np.argmax(sims))
+            if float(sims[best]) < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[best]
+
+        try:
+            current = self._doc_versions(list(entry["doc_versions"].keys()))
+        except Exception as e:
+            print(f"[AnswerCache] Warning: version check failed: {e}")
+            self.misses += 1
+            return None
+
+        if current != entry["doc_versions"]:
+            with self._lock:
+                stale = [i for i, e in enumerate(self._entries) if e is entry]
+                self._evict(stale)
+            self.invalidations += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return {**entry, "similarity": float(sims[best])}
+
+    def store(self, query: str, query_vector, answer: str, citation_map: list, scope=None):
+        if not answer or not citation_map:
+            return
+        doc_ids = sorted({c.get("doc_id") for c in citation_map if c.get("doc_id")})
+        try:
+            doc_versions = self._doc_versions(doc_ids)
+        except Exception as e:
+            print(f"[AnswerCache] Warning: not caching answer, version read failed: {e}")
+            return
+
+        entry = {
+            "query": query,
+            "vector": self._normalize(query_vector),
+            "answer": answer,
+            "citation_map": citation_map,
+            "doc_versions": doc_versions,
+            "scope": self._scope_key(scope),
+            "created": time.time(),
+        }
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                # Oldest first
+                self._evict(range(len(self._entries) - self.max_entries))
+            self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,95 @@
+import math
+import re
+import threading
+from app.config import CONTEXT_TOKEN_BUDGET, CONTEXT_MIN_SNIPPET_TOKENS, TOKEN_ESTIMATE_CHARS_PER_TOKEN
+
+# End of a sentence: terminal punctuation, optional closing quote/bracket, then whitespace
+_SENTENCE_END_RE = re.compile(r"[.!?][\"')\]]*\s")
+
+
+class TokenEstimator:
+    """Fast chars-per-token token estimate, calibrated against the model's real counts.
+
+    The LLM reports the prompt's actual token count with each response;
+    `observe` folds that into an exponential moving average of the
+    chars/token ratio, so estimates track the real tokenizer on our content
+    without calling it on the request path.
+    """
+
+    def __init__(self, chars_per_token: float = TOKEN_ESTIMATE_CHARS_PER_TOKEN, smoothing: float = 0.2):
+        self.chars_per_token = chars_per_token
+        self.smoothing = smoothing
+        self.observations = 0
+        self._lock = threading.Lock()
+
+    def estimate(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token) if text else 0
+
+    def max_chars(self, tokens: int) -> int:
+        return int(tokens * self.chars_per_token)
+
+    def observe(self, text: str, actual_tokens: int):
+        if not text or not actual_tokens:
+            return
+        ratio = min(max(len(text) / actual_tokens, 1.5), 8.0)  # clamp outliers (e.g. mostly-code prompts)
+        with self._lock:
+            self.chars_per_token += self.smoothing * (ratio - self.chars_per_token)
+            self.observations += 1
+
+    def stats(self) -> dict:
+        return {"chars_per_token": round(self.chars_per_token, 3), "observations": self.observations}
+
+
+token_estimator = TokenEstimator()
+
+
+def trim_to_sentences(text: str, max_tokens: int, estimator: TokenEstimator = token_estimator) -> str:
+    """Longest prefix of `text` within `max_tokens` that ends at a sentence boundary.
+
+    Falls back to the last word boundary when no sentence ends inside the limit.
+    """
+    limit = estimator.max_chars(max_tokens)
+    if len(text) <= limit:
+        return text
+    head = text[:limit + 1]
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(head)]
+    if ends:
+        return head[:ends[-1]].rstrip()
+    cut = head.rfind(" ")
+    return (head[:cut] if cut > 0 else head[:limit]).rstrip() + "…"
+
+
+def pack_context(snippets, budget_tokens: int = CONTEXT_TOKEN_BUDGET, min_tokens: int = CONTEXT_MIN_SNIPPET_TOKENS,
+                 estimator: TokenEstimator = token_estimator):
+    """Fit `(id, text)` snippets, best first, into a token budget.
+
+    Snippets are taken whole while they fit; the first one that doesn't is
+    trimmed at a sentence boundary if at least `min_tokens` remain, and
+    packing stops there. Returns (packed [(id, text)], stats).
+    """
+    packed = []
+    used = 0
+    trimmed = 0
+    for sid, text in snippets:
+        text = (text or "").strip()
+        if not text:
+            continue
+        remaining = budget_tokens - used
+        tokens = estimator.estimate(text)
+        if tokens > remaining:
+            if remaining < min_tokens:
+                break
+            text = trim_to_sentences(text, remaining, estimator)
+            tokens = estimator.estimate(text)
+            trimmed += 1
+        packed.append((sid, text))
+        used += tokens
+        if tokens and used >= budget_tokens - min_tokens:
+            break
+    return packed, {
+        "context_tokens": used,
+        "budget_tokens": budget_tokens,
+        "snippets": len(packed),
+        "trimmed": trimmed,
+        "dropped": len(snippets) - len(packed),
+    }
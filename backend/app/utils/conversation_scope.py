@@ -0,0 +1,46 @@
+from app.utils.supabase_client import get_supabase
+
+# A conversation's document scope is persisted in Supabase with the conversation:
+# every user message records the scope its turn ran under in `metadata.doc_ids`,
+# and the latest user message's value is the conversation's current scope.
+
+
+def scope_from_messages(messages):
+    """Current scope from a conversation's messages (oldest first), or None for the whole corpus."""
+    for m in reversed(messages or []):
+        if m.get("role") == "user":
+            return (m.get("metadata") or {}).get("doc_ids") or None
+    return None
+
+
+def get_scope(conversation_id: str):
+    """doc_ids the conversation's searches are restricted to, or None for the whole corpus."""
+    res = (
+        get_supabase().table("messages").select("role,metadata")
+        .eq("conversation_id", conversation_id).eq("role", "user")
+        .order("created_at", desc=True).limit(1).execute()
+    )
+    return scope_from_messages(res.data)
+
+
+def validate_doc_ids(doc_ids):
+    """Deduplicated, sorted doc_ids; raises ValueError naming any that don't exist."""
+    doc_ids = sorted(set(doc_ids))
+    if not doc_ids:
+        return []
+    res = get_supabase().table("documents").select("doc_id").in_("doc_id", doc_ids).execute()
+    unknown = set(doc_ids) - {row["doc_id"] for row in (res.data or [])}
+    if unknown:
+        raise ValueError(f"Unknown doc_ids: {', '.join(sorted(unknown))}")
+    return doc_ids
+
+
+def resolve_scope(conversation_id: str | None, doc_ids=None):
+    """Effective scope for a new turn.
+
+    `doc_ids` from the request replaces the scope ([] clears it); None keeps the
+    conversation's current scope (none for a new conversation).
+    """
+    if doc_ids is None:
+        return get_scope(conversation_id) if conversation_id else None
+    return validate_doc_ids(doc_ids) or None
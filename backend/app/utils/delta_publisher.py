@@ -0,0 +1,56 @@
+import time
+from app.config import DELTA_FLUSH_MS, DELTA_FLUSH_CHARS
+
+
+class DeltaPublisher:
+    """Coalesce LLM text fragments into fewer `text_delta` events.
+
+    Fragments are buffered and published as one event when either
+    `flush_ms` has elapsed since the previous flush or `flush_chars` characters
+    are pending. The very first fragment is flushed immediately so
+    time-to-first-token is unaffected. Each event's `fragments` field reports
+    how many fragments it merged.
+
+    The time limit is checked as fragments arrive; call `flush()` once the
+    stream ends to publish the remainder.
+    """
+
+    def __init__(self, publish, conversation_id: str, flush_ms: int = DELTA_FLUSH_MS, flush_chars: int = DELTA_FLUSH_CHARS):
+        self._publish = publish
+        self.conversation_id = conversation_id
+        self.flush_seconds = flush_ms / 1000.0
+        self.flush_chars = flush_chars
+        self._buffer = []
+        self._buffered_chars = 0
+        self._last_flush = time.monotonic()
+        # Counters
+        self.fragments = 0
+        self.flushes = 0
+
+    def add(self, fragment: str):
+        if not fragment:
+            return
+        self._buffer.append(fragment)
+        self._buffered_chars += len(fragment)
+        self.fragments += 1
+
+        if (
+            self.flushes == 0
+            or self._buffered_chars >= self.flush_chars
+            or time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        merged = len(self._buffer)
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._buffered_chars = 0
+        self._last_flush = time.monotonic()
+        self.flushes += 1
+        self._publish(self.conversation_id, "text_delta", {"delta": text, "fragments": merged})
+
+    def stats(self) -> dict:
+        return {"fragments": self.fragments, "flushes": self.flushes}
@@ -0,0 +1,72 @@
+import numpy as np
+from app.config import MMR_LAMBDA
+
+
+def mmr_order(vectors, relevance, lambda_: float = MMR_LAMBDA, k: int | None = None) -> list:
+    """Order candidates by Maximal Marginal Relevance; returns indices, first pick first.
+
+    Each step picks the candidate maximizing
+    `lambda_ * relevance - (1 - lambda_) * max cosine similarity to the already picked`.
+    The pairwise similarity matrix is computed once; each step is one vectorized update.
+    """
+    n = len(vectors)
+    k = n if k is None else min(k, n)
+    if k == 0:
+        return []
+    v = np.asarray(vectors, dtype=np.float32)
+    v = v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+    sim = v @ v.T
+    rel = np.asarray(relevance, dtype=np.float32)
+
+    picked = [int(np.argmax(rel))]
+    redundancy = sim[picked[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[picked[0]] = False
+    while len(picked) < k:
+        scores = np.where(available, lambda_ * rel - (1 - lambda_) * redundancy, -np.inf)
+        i = int(np.argmax(scores))
+        picked.append(i)
+        available[i] = False
+        np.maximum(redundancy, sim[i], out=redundancy)
+    return picked
+
+
+def _span_key(candidate):
+    p = candidate["payload"]
+    if p.get("start_offset") is None or p.get("end_offset") is None:
+        return None
+    return p.get("doc_id"), p.get("page_number")
+
+
+def merge_into_span(spans: list, candidate: dict) -> bool:
+    """Merge `candidate` into a span it overlaps or touches; False if there is none.
+
+    Mergeable spans come from the same doc_id/page_number with overlapping
+    character offsets (e.g. neighbouring chunks sharing their 200-char
+    overlap). The merged span covers both ranges, stitches the text and
+    keeps the better score.
+    """
+    key = _span_key(candidate)
+    if key is not None:
+        p = candidate["payload"]
+        for span in spans:
+            if _span_key(span) != key:
+                continue
+            sp = span["payload"]
+            if p["start_offset"] > sp["end_offset"] or p["end_offset"] < sp["start_offset"]:
+                continue
+            first, second = (sp, p) if sp["start_offset"] <= p["start_offset"] else (p, sp)
+            text = first.get("text") or ""
+            if second["end_offset"] > first["end_offset"]:
+                text += (second.get("text") or "")[first["end_offset"] - second["start_offset"]:]
+            span["payload"] = {
+                **sp,
+                "text": text,
+                "start_offset": first["start_offset"],
+                "end_offset": max(first["end_offset"], second["end_offset"]),
+            }
+            scores = [s for s in (span.get("score"), candidate.get("score")) if s is not None]
+            span["score"] = max(scores) if scores else None
+            span["merged"] = span.get("merged", 1) + 1
+            return True
+    return False
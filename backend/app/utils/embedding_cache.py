@@ -0,0 +1,146 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.config import get_redis_bytes, EMBED_CACHE_LRU_SIZE, EMBED_CACHE_TTL_SECONDS
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query used for cache keys."""
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: in-process LRU backed by Redis with a TTL.
+
+    Keys are a hash of (model name, normalized text). Vectors are stored as
+    raw float32 bytes in both tiers (384 dims -> 1.5 KB), which keeps the LRU
+    small and avoids JSON encoding in Redis.
+    """
+
+    def __init__(self, namespace: str, model_name: str, lru_size: int = EMBED_CACHE_LRU_SIZE,
+                 ttl_seconds: int = EMBED_CACHE_TTL_SECONDS, normalize=None):
+        self.namespace = namespace
+        self.model_name = model_name
+        self.lru_size = lru_size
+        self.ttl_seconds = ttl_seconds
+        self.normalize = normalize or (lambda t: t)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        # Counters
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(f"{self.model_name}\0{self.normalize(text)}".encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def _lru_get(self, key: str):
+        with self._lock:
+            blob = self._lru.get(key)
+            if blob is not None:
+                self._lru.move_to_end(key)
+            return blob
+
+    def _lru_put(self, key: str, blob: bytes):
+        with self._lock:
+            self._lru[key] = blob
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get_local(self, text: str):
+        """LRU-only lookup; never touches Redis."""
+        blob = self._lru_get(self.key(text))
+        if blob is None:
+            return None
+        self.local_hits += 1
+        return np.frombuffer(blob, dtype=np.float32).tolist()
+
+    def get(self, text: str):
+        """Return the cached vector for `text` as a list of floats, or None."""
+        key = self.key(text)
+        blob = self._lru_get(key)
+        if blob is not None:
+            self.local_hits += 1
+            return np.frombuffer(blob, dtype=np.float32).tolist()
+
+        try:
+            blob = get_redis_bytes().get(key)
+        except Exception as e:
+            print(f"[EmbeddingCache] Redis get failed: {e}")
+            blob = None
+        if blob is None:
+            self.misses += 1
+            return None
+
+        self.redis_hits += 1
+        self._lru_put(key, blob)
+        return np.frombuffer(blob, dtype=np.float32).tolist()
+
+    def put(self, text: str, vector):
+        key = self.key(text)
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        self._lru_put(key, blob)
+        try:
+            get_redis_bytes().set(key, blob, ex=self.ttl_seconds or None)
+        except Exception as e:
+            print(f"[EmbeddingCache] Redis set failed: {e}")
+
+    def get_many(self, texts):
+        """Batch lookup; returns a list aligned with `texts` (None for misses).
+
+        LRU misses are fetched from Redis with a single MGET.
+        """
+        keys = [self.key(t) for t in texts]
+        results = [None] * len(texts)
+        remote = []
+        for i, key in enumerate(keys):
+            blob = self._lru_get(key)
+            if blob is not None:
+                self.local_hits += 1
+                results[i] = np.frombuffer(blob, dtype=np.float32).tolist()
+            else:
+                remote.append(i)
+
+        if remote:
+            try:
+                blobs = get_redis_bytes().mget([keys[i] for i in remote])
+            except Exception as e:
+                print(f"[EmbeddingCache] Redis mget failed: {e}")
+                blobs = [None] * len(remote)
+            for i, blob in zip(remote, blobs):
+                if blob is None:
+                    self.misses += 1
+                    continue
+                self.redis_hits += 1
+                self._lru_put(keys[i], blob)
+                results[i] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return results
+
+    def put_many(self, texts, vectors):
+        pipe = get_redis_bytes().pipeline(transaction=False)
+        for text, vector in zip(texts, vectors):
+            key = self.key(text)
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            self._lru_put(key, blob)
+            pipe.set(key, blob, ex=self.ttl_seconds or None)
+        try:
+            pipe.execute()
+        except Exception as e:
+            print(f"[EmbeddingCache] Redis pipeline set failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        hits = self.local_hits + self.redis_hits
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "lru_entries": len(self._lru),
+        }
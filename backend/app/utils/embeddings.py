@@ -1,10 +1,196 @@
-from sentence_transformers import SentenceTransformer
-import numpy as np
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app.config import (
+    lazy_singleton,
+    EMBED_BATCH_MAX_SIZE,
+    EMBED_BATCH_MAX_WAIT_MS,
+    EMBED_CHUNK_CACHE_TTL_SECONDS,
+    EMBEDDING_BACKEND,
+    EMBEDDING_ONNX_MODEL_PATH,
+    EMBEDDING_ONNX_FILE,
+)
+from app.utils.embedding_cache import EmbeddingCache, normalize_query
 
-# Load once
-model = SentenceTransformer("all-MiniLM-L6-v2")
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384  # Qdrant collection vector size; every backend must produce this
+
+# Identifies the vectors a backend produces; used in cache keys so fp32 and
+# quantized vectors are never mixed up
+if EMBEDDING_BACKEND == "onnx":
+    EMBEDDING_MODEL_ID = f"{EMBEDDING_MODEL_NAME}:onnx:{EMBEDDING_ONNX_FILE}"
+else:
+    EMBEDDING_MODEL_ID = EMBEDDING_MODEL_NAME
+
+
+def load_model(backend: str = EMBEDDING_BACKEND):
+    """Load the embedding model for the given backend.
+
+    "onnx" runs the exported model under ONNX Runtime; with the default
+    EMBEDDING_ONNX_FILE that is the dynamically int8-quantized export.
+    """
+    # Imported here: pulling in torch/onnxruntime dominates import time
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        m = SentenceTransformer(EMBEDDING_ONNX_MODEL_PATH, backend="onnx", model_kwargs={"file_name": EMBEDDING_ONNX_FILE})
+    else:
+        m = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    dim = m.get_sentence_embedding_dimension()
+    if dim != EMBEDDING_DIMENSION:
+        raise ValueError(f"Embedding backend '{backend}' produces {dim}-d vectors, expected {EMBEDDING_DIMENSION}")
+    return m
+
+
+@lazy_singleton
+def get_model():
+    """The process-wide embedding model, loaded on first use (or by `warmup`)."""
+    return load_model()
+
+
+def warmup():
+    """Load the model and run one encode so the first real request pays no setup cost."""
+    get_model().encode(["warmup"], show_progress_bar=False)
 
 def embed_texts(texts):
     """Return embeddings for a list of text chunks."""
-    vectors = model.encode(texts, show_progress_bar=False)
+    vectors = get_model().encode(texts, show_progress_bar=False)
     return vectors.tolist()  # list of lists for Qdrant
+
+
+# Ingestion-side cache keyed on exact chunk text; a small LRU is enough since
+# hits come from re-ingesting content seen in an earlier job
+chunk_cache = EmbeddingCache("embcache:chunk", EMBEDDING_MODEL_ID, lru_size=2048, ttl_seconds=EMBED_CHUNK_CACHE_TTL_SECONDS)
+
+
+def embed_texts_cached(texts):
+    """Embed chunks, encoding only those not already in the chunk cache.
+
+    Returns (vectors, cache_hits).
+    """
+    vectors = chunk_cache.get_many(texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = embed_texts([texts[i] for i in missing])
+        for i, vec in zip(missing, fresh):
+            vectors[i] = vec
+        chunk_cache.put_many([texts[i] for i in missing], fresh)
+    return vectors, len(texts) - len(missing)
+
+
+def embed_queries(texts):
+    """Embed many queries at once: query-cache hits are reused, the rest go through one encode call."""
+    vectors = query_cache.get_many(texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = embed_texts([texts[i] for i in missing])
+        for i, vec in zip(missing, fresh):
+            vectors[i] = vec
+        query_cache.put_many([texts[i] for i in missing], fresh)
+    return vectors
+
+
+class QueryEmbeddingBatcher:
+    """Collect query-embedding requests from concurrent callers into shared encode calls.
+
+    Callers enqueue a text and block on a Future. A single background thread
+    takes the first pending request, waits up to `max_wait_ms` for others to
+    arrive (or until `max_batch_size` is reached), encodes the whole batch in
+    one `model.encode` call and hands each caller its own vector.
+    """
+
+    def __init__(self, max_batch_size: int = EMBED_BATCH_MAX_SIZE, max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Counters
+        self.requests = 0
+        self.batches = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def embed(self, text: str) -> list:
+        return self.submit(text).result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Window closed; still take anything already queued
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                vectors = get_model().encode([text for text, _ in batch], show_progress_bar=False)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+
+            self.requests += len(batch)
+            self.batches += 1
+            for (_, fut), vec in zip(batch, vectors):
+                fut.set_result(vec.tolist())
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+query_batcher = QueryEmbeddingBatcher()
+
+
+query_cache = EmbeddingCache("embcache:query", EMBEDDING_MODEL_ID, normalize=normalize_query)
+
+
+def embed_query(text: str) -> list:
+    """Return the embedding for a single query.
+
+    Served from the query cache when possible; otherwise batched with
+    concurrent callers and written back to the cache.
+    """
+    vec = query_cache.get(text)
+    if vec is not None:
+        return vec
+    vec = query_batcher.embed(text)
+    query_cache.put(text, vec)
+    return vec
+
+
+async def embed_query_async(text: str) -> list:
+    """Awaitable variant of `embed_query` that doesn't block the event loop."""
+    vec = query_cache.get_local(text)
+    if vec is not None:
+        return vec
+    # Redis lookup and the batcher wait both block, so run them off the loop
+    return await asyncio.to_thread(embed_query, text)
@@ -0,0 +1,77 @@
+"""BM25-style sparse vectors and reciprocal rank fusion for hybrid retrieval.
+
+Chunks are indexed as sparse vectors whose values are BM25 term-frequency
+weights; the companion Qdrant collection applies the IDF part itself
+(`Modifier.IDF`), so document statistics never have to be tracked here.
+"""
+import re
+import zlib
+from collections import Counter
+from app.config import BM25_K1, BM25_B, BM25_AVG_CHUNK_TOKENS, HYBRID_RRF_K
+
+SPARSE_VECTOR_NAME = "bm25"
+SPARSE_COLLECTION_SUFFIX = "_sparse"
+
+# Keeps identifiers like "ab-1234", "v2.1" or "snake_case" as single tokens
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+# Dropped from queries only; they match nearly every chunk and would drown out real keywords
+QUERY_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it its me my of on or "
+    "that the this to was what when where which who why will with you your".split()
+)
+
+
+def sparse_collection_name(collection_name: str) -> str:
+    return f"{collection_name}{SPARSE_COLLECTION_SUFFIX}"
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def _term_index(token: str) -> int:
+    # Stable across processes (unlike hash()), and fits Qdrant's u32 sparse indices
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _to_sparse(weights: dict):
+    indices = sorted(weights)
+    return indices, [weights[i] for i in indices]
+
+
+def document_sparse_vector(text: str):
+    """(indices, values) with BM25-saturated term frequencies for one chunk."""
+    tokens = tokenize(text)
+    if not tokens:
+        return [], []
+    length_norm = 1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_CHUNK_TOKENS
+    weights = {}
+    for token, tf in Counter(tokens).items():
+        idx = _term_index(token)
+        weights[idx] = weights.get(idx, 0.0) + tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+    return _to_sparse(weights)
+
+
+def query_sparse_vector(text: str):
+    """(indices, values) for a query: each distinct non-stopword term weighted 1."""
+    terms = [t for t in tokenize(text) if t not in QUERY_STOPWORDS]
+    return _to_sparse({_term_index(t): 1.0 for t in terms})
+
+
+def rrf_fuse(legs: dict, k: int = HYBRID_RRF_K, limit: int | None = None) -> list:
+    """Merge ranked hit lists with reciprocal rank fusion.
+
+    `legs` maps a leg name to hits ordered best-first; hits are matched across
+    legs by `.id`. Returns dicts with the first-seen hit, the fused score and
+    each leg's 1-based rank and raw score, best-first.
+    """
+    fused = {}
+    for leg, hits in legs.items():
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit.id, {"hit": hit, "rrf_score": 0.0, "ranks": {}, "scores": {}})
+            entry["rrf_score"] += 1.0 / (k + rank)
+            entry["ranks"][leg] = rank
+            entry["scores"][leg] = hit.score
+    ordered = sorted(fused.values(), key=lambda e: e["rrf_score"], reverse=True)
+    return ordered[:limit] if limit else ordered
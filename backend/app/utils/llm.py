@@ -1,15 +1,18 @@
-from google import genai
-from google.genai.types import HttpOptions
 import os
 from dotenv import load_dotenv
+from app.config import lazy_singleton
 
 load_dotenv()
 
 USE_VERTEXAI = os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "True").lower() == "true"
 API_KEY = os.getenv("GOOGLE_GENAI_API_KEY")
 
-# Initialize once to reuse (avoid reloading model on every query)
-client = genai.Client(http_options=HttpOptions(api_version="v1"), api_key=API_KEY, vertexai=USE_VERTEXAI)
+# Built once on first use and reused (the SDK import alone is slow, so it's deferred too)
+@lazy_singleton
+def get_genai_client():
+    from google import genai
+    from google.genai.types import HttpOptions
+    return genai.Client(http_options=HttpOptions(api_version="v1"), api_key=API_KEY, vertexai=USE_VERTEXAI)
 
 def generate_response(messages):
     """Call the local transformer model with messages."""
@@ -17,7 +20,7 @@ def generate_response(messages):
         # Extract text content from OpenAI-style messages
         prompt_text = "\n".join([m["content"] for m in messages if "content" in m])
 
-        response = client.models.generate_content(
+        response = get_genai_client().models.generate_content(
             model="gemini-2.5-flash",
             contents=prompt_text,  # pass a string instead of list of dicts
         )
@@ -26,12 +29,14 @@ def generate_response(messages):
         return f"LLM error: {e}"
 
 
-def generate_response_stream(messages):
+def generate_response_stream(messages, usage=None):
     """Stream response tokens from the LLM using generate_content_stream.
 
     Yields decoded string deltas as they arrive. This wrapper is intentionally
     small: it converts the SDK stream events into a simple generator of text
     pieces suitable for publishing as incremental `text_delta` events.
+    If a `usage` dict is passed, it receives the model-reported
+    `prompt_tokens` / `output_tokens` once the stream reports them.
     """
     try:
         prompt_text = "\n".join([m.get("content", "") for m in messages])
@@ -40,12 +45,19 @@ def generate_response_stream(messages):
         # `generate_content_stream` which yields incremental response events.
         # Each event may contain a `.text` or `.delta` attribute depending on
         # SDK version; handle commonly seen shapes.
-        stream = client.models.generate_content_stream(
+        stream = get_genai_client().models.generate_content_stream(
             model="gemini-2.5-flash",
             contents=prompt_text,
         )
 
         for event in stream:
+            meta = getattr(event, "usage_metadata", None)
+            if usage is not None and meta is not None:
+                if getattr(meta, "prompt_token_count", None):
+                    usage["prompt_tokens"] = meta.prompt_token_count
+                if getattr(meta, "candidates_token_count", None):
+                    usage["output_tokens"] = meta.candidates_token_count
+
             # Event shapes vary; attempt to extract text from common fields.
             text = None
             if hasattr(event, "text") and event.text:
@@ -0,0 +1,348 @@
+"""Embedded vector store: a memory-mapped vector matrix with a sidecar payload file.
+
+Layout of one collection directory (`LOCAL_INDEX_DIR/<collection>/`):
+
+- `meta.json`       dimension and storage dtype
+- `vectors.bin`     row-major matrix of L2-normalized vectors (float16 or float32)
+- `ids.bin`         point id per row, fixed-width 36-byte ASCII (fits a UUID)
+- `docs.bin`        int32 doc code per row; -1 marks a deleted row
+- `doc_codes.json`  doc_id -> doc code
+- `payloads.bin`    concatenated JSON payloads; `offsets.bin` holds each row's (start, end)
+
+Files are mapped rather than read, so opening a collection costs the same for
+a thousand chunks as for millions. Appends write `docs.bin` last, so its length
+is the number of committed rows and readers ignore any longer tail of the
+other files (e.g. after a crash mid-append). Writers in different processes
+serialize on an flock; readers pick up growth by re-mapping when `docs.bin`
+changes size. Deletes only tombstone rows; the space is not reclaimed.
+"""
+import fcntl
+import json
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from dataclasses import dataclass
+import numpy as np
+from app.utils.vectorstore import VectorStore
+
+ID_DTYPE = np.dtype("S36")
+DOC_DTYPE = np.dtype("<i4")
+OFFSET_DTYPE = np.dtype("<u8")
+DELETED = -1
+SEARCH_BLOCK_ROWS = 4096  # rows scored per matmul; small enough for float16 upcasting to stay in cache
+
+
+# Consistent view of a collection's mapped files; replaced as a whole when rows are added
+Snapshot = namedtuple("Snapshot", "n vectors ids docs offsets")
+
+
+@dataclass
+class LocalHit:
+    id: str
+    score: float
+    payload: dict
+    vector: list | None = None
+
+
+def _normalize(vectors):
+    arr = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    return arr / np.where(norms == 0, 1, norms)
+
+
+def _map(path, dtype, rows, cols=None, mode="r"):
+    if rows == 0:
+        return None
+    shape = (rows, cols) if cols else (rows,)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+
+class LocalCollection:
+    def __init__(self, path, dim=None, dtype="float32"):
+        self.path = path
+        self._lock = threading.Lock()  # writers in this process
+        self._map_lock = threading.Lock()
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            if dim is None:
+                raise ValueError(f"Local collection at {path} does not exist")
+            os.makedirs(path, exist_ok=True)
+            with open(meta_path, "w") as f:
+                json.dump({"dim": dim, "dtype": dtype}, f)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        self._snap = Snapshot(None, None, None, None, None)
+        self._doc_codes_mtime = None
+        self.doc_codes = {}
+        self._payload_fd = None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _committed_rows(self):
+        try:
+            return os.path.getsize(self._file("docs.bin")) // DOC_DTYPE.itemsize
+        except FileNotFoundError:
+            return 0
+
+    def _refresh(self) -> Snapshot:
+        """Return the current snapshot, re-mapping first if rows or doc codes changed on disk."""
+        with self._map_lock:
+            n = self._committed_rows()
+            if n != self._snap.n:
+                self._snap = Snapshot(
+                    n,
+                    _map(self._file("vectors.bin"), self.dtype, n, self.dim),
+                    _map(self._file("ids.bin"), ID_DTYPE, n),
+                    _map(self._file("docs.bin"), DOC_DTYPE, n),
+                    _map(self._file("offsets.bin"), OFFSET_DTYPE, n, 2),
+                )
+            try:
+                mtime = os.path.getmtime(self._file("doc_codes.json"))
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self._doc_codes_mtime:
+                if mtime is not None:
+                    with open(self._file("doc_codes.json")) as f:
+                        self.doc_codes = json.load(f)
+                self._doc_codes_mtime = mtime
+            return self._snap
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock, open(self._file("lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def payload(self, snap, row):
+        if self._payload_fd is None:
+            self._payload_fd = os.open(self._file("payloads.bin"), os.O_RDONLY)
+        start, end = (int(x) for x in snap.offsets[row])
+        return json.loads(os.pread(self._payload_fd, end - start, start))
+
+    def _tombstone(self, snap, rows):
+        if len(rows) == 0:
+            return
+        docs = np.memmap(self._file("docs.bin"), dtype=DOC_DTYPE, mode="r+", shape=(snap.n,))
+        docs[rows] = DELETED
+        docs.flush()
+        del docs
+
+    def rows_for_ids(self, snap, ids):
+        if not snap.n:
+            return np.array([], dtype=np.int64)
+        wanted = np.array([str(i).encode("ascii") for i in ids], dtype=ID_DTYPE)
+        return np.flatnonzero(np.isin(snap.ids, wanted) & (snap.docs != DELETED))
+
+    @staticmethod
+    def _live_mask(snap, start, end):
+        return snap.docs[start:end] != DELETED
+
+    def append(self, vectors, payloads, ids):
+        vecs = _normalize(vectors).astype(self.dtype)
+        if vecs.ndim != 2 or vecs.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d vectors, got shape {vecs.shape}")
+        with self._write_lock():
+            snap = self._refresh()
+            n = snap.n
+            # Drop any uncommitted tail left by a crashed writer
+            for name, row_bytes in (("vectors.bin", self.dim * self.dtype.itemsize), ("ids.bin", ID_DTYPE.itemsize),
+                                    ("offsets.bin", 2 * OFFSET_DTYPE.itemsize)):
+                if os.path.exists(self._file(name)):
+                    os.truncate(self._file(name), n * row_bytes)
+            payload_end = int(snap.offsets[n - 1][1]) if n else 0
+            if os.path.exists(self._file("payloads.bin")):
+                os.truncate(self._file("payloads.bin"), payload_end)
+
+            # Upsert semantics: an id written again replaces its earlier row
+            self._tombstone(snap, self.rows_for_ids(snap, ids))
+
+            codes_changed = False
+            doc_codes = []
+            for p in payloads:
+                doc_id = p.get("doc_id")
+                if doc_id not in self.doc_codes:
+                    self.doc_codes[doc_id] = len(self.doc_codes)
+                    codes_changed = True
+                doc_codes.append(self.doc_codes[doc_id])
+            if codes_changed:
+                tmp = self._file("doc_codes.json.tmp")
+                with open(tmp, "w") as f:
+                    json.dump(self.doc_codes, f)
+                os.replace(tmp, self._file("doc_codes.json"))
+
+            blobs = [json.dumps(p, ensure_ascii=False).encode("utf-8") for p in payloads]
+            ends = payload_end + np.cumsum([len(b) for b in blobs], dtype=np.uint64)
+            starts = np.concatenate([np.array([payload_end], dtype=OFFSET_DTYPE), ends[:-1]])
+            with open(self._file("payloads.bin"), "ab") as f:
+                f.write(b"".join(blobs))
+            with open(self._file("vectors.bin"), "ab") as f:
+                f.write(vecs.tobytes())
+            with open(self._file("ids.bin"), "ab") as f:
+                f.write(np.array([str(i).encode("ascii") for i in ids], dtype=ID_DTYPE).tobytes())
+            with open(self._file("offsets.bin"), "ab") as f:
+                f.write(np.stack([starts, ends.astype(OFFSET_DTYPE)], axis=1).tobytes())
+            # Commit point: rows become visible once their doc codes are written
+            with open(self._file("docs.bin"), "ab") as f:
+                f.write(np.array(doc_codes, dtype=DOC_DTYPE).tobytes())
+            self._refresh()
+
+    def search(self, vector, limit, doc_ids=None, with_vectors=False):
+        return self.search_batch([vector], limit, doc_ids=doc_ids, with_vectors=with_vectors)[0]
+
+    def search_batch(self, vectors, limit, doc_ids=None, with_vectors=False):
+        """Top `limit` hits for each query vector; all queries share one pass over the matrix."""
+        snap = self._refresh()
+        q = _normalize(vectors).reshape(-1, self.dim)
+        if not snap.n or limit <= 0:
+            return [[] for _ in q]
+        best_scores = []
+        best_rows = []
+        for rows, block, mask in self._blocks(snap, doc_ids):
+            scores = block @ q.T  # (rows, queries)
+            if mask is not None:
+                scores[~mask] = -np.inf
+            k = min(limit, len(rows))
+            top = np.argpartition(-scores, k - 1, axis=0)[:k]
+            best_scores.append(np.take_along_axis(scores, top, axis=0))
+            best_rows.append(rows[top])
+        if not best_scores:
+            return [[] for _ in q]
+        scores = np.concatenate(best_scores)
+        rows = np.concatenate(best_rows)
+        results = []
+        for j in range(len(q)):
+            order = np.argsort(-scores[:, j])[:limit]
+            results.append([
+                LocalHit(
+                    id=snap.ids[r].decode("ascii"),
+                    score=float(scores[i, j]),
+                    payload=self.payload(snap, r),
+                    vector=np.asarray(snap.vectors[r], dtype=np.float32).tolist() if with_vectors else None,
+                )
+                for i, r in zip(order, rows[order, j])
+                if np.isfinite(scores[i, j])
+            ])
+        return results
+
+    def _blocks(self, snap, doc_ids):
+        """Yield (row indices, float32 vectors, live mask or None) in blocks of SEARCH_BLOCK_ROWS."""
+        if doc_ids is None:
+            # Whole collection: contiguous blocks, tombstones masked out
+            for start in range(0, snap.n, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, snap.n)
+                mask = self._live_mask(snap, start, end)
+                if mask.any():
+                    yield np.arange(start, end), np.asarray(snap.vectors[start:end], dtype=np.float32), mask
+            return
+        # Scoped: find the rows from the doc codes (4 bytes/row) and only read
+        # and score those, so the cost follows the scope, not the corpus
+        codes = [self.doc_codes[d] for d in doc_ids if d in self.doc_codes]
+        if not codes:
+            return
+        matching = np.flatnonzero(np.isin(snap.docs, codes))
+        for i in range(0, len(matching), SEARCH_BLOCK_ROWS):
+            rows = matching[i:i + SEARCH_BLOCK_ROWS]
+            yield rows, np.asarray(snap.vectors[rows], dtype=np.float32), None
+
+    def doc_rows(self, snap, doc_id):
+        if not snap.n or doc_id not in self.doc_codes:
+            return np.array([], dtype=np.int64)
+        return np.flatnonzero(snap.docs == self.doc_codes[doc_id])
+
+    def delete_document(self, doc_id):
+        with self._write_lock():
+            snap = self._refresh()
+            self._tombstone(snap, self.doc_rows(snap, doc_id))
+
+    def delete_ids(self, ids):
+        with self._write_lock():
+            snap = self._refresh()
+            self._tombstone(snap, self.rows_for_ids(snap, ids))
+
+    def scroll_document(self, doc_id, payload_fields):
+        snap = self._refresh()
+        points = []
+        for r in self.doc_rows(snap, doc_id):
+            payload = self.payload(snap, r)
+            points.append((snap.ids[r].decode("ascii"), {k: payload.get(k) for k in payload_fields}))
+        return points
+
+    def count(self, doc_id):
+        return len(self.doc_rows(self._refresh(), doc_id))
+
+
+class LocalVectorStore(VectorStore):
+    """In-process backend over `LocalCollection`s stored under `root`.
+
+    Search is exact (vectorized brute force over the mapped matrix). There is
+    no sparse index, so hybrid retrieval falls back to dense-only.
+    """
+
+    def __init__(self, root, dtype="float32"):
+        self.root = root
+        self.dtype = dtype
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, name, dim=None):
+        """The opened collection, or None if it hasn't been created yet (and no `dim` was given)."""
+        with self._lock:
+            col = self._collections.get(name)
+            if col is None:
+                path = os.path.join(self.root, name)
+                if dim is None and not os.path.exists(os.path.join(path, "meta.json")):
+                    return None
+                col = LocalCollection(path, dim=dim, dtype=self.dtype)
+                self._collections[name] = col
+            return col
+
+    def init_collection(self, name, vector_size):
+        col = self._collection(name, dim=vector_size)
+        snap = col._refresh()
+        print(f"[LocalIndex] Collection '{name}' at {col.path} ({snap.n} rows, {col.dtype.name})")
+
+    def upsert(self, collection_name, vectors, payloads, ids, wait=True):
+        # Appends are visible to readers as soon as they return; `wait` is moot
+        if len(ids):
+            col = self._collection(collection_name)
+            if col is None:
+                raise ValueError(f"Collection '{collection_name}' does not exist; call init_collection first")
+            col.append(vectors, payloads, ids)
+
+    def search(self, collection_name, vector, limit, doc_ids=None, with_vectors=False):
+        col = self._collection(collection_name)
+        return col.search(vector, limit, doc_ids=doc_ids, with_vectors=with_vectors) if col else []
+
+    def search_batch(self, collection_name, vectors, limit, doc_ids=None):
+        col = self._collection(collection_name)
+        return col.search_batch(vectors, limit, doc_ids=doc_ids) if col else [[] for _ in vectors]
+
+    def count(self, collection_name, doc_id):
+        col = self._collection(collection_name)
+        return col.count(doc_id) if col else 0
+
+    def delete_document(self, collection_name, doc_id):
+        col = self._collection(collection_name)
+        if col:
+            col.delete_document(doc_id)
+
+    def scroll_document(self, collection_name, doc_id, payload_fields):
+        col = self._collection(collection_name)
+        return col.scroll_document(doc_id, payload_fields) if col else []
+
+    def delete_ids(self, collection_name, ids):
+        col = self._collection(collection_name)
+        if col:
+            col.delete_ids(ids)
+
+    def healthy(self):
+        # Nothing remote to reach; the index directory just has to be usable.
+        # A probe must not create it: init_collection does that
+        return os.path.isdir(self.root) and os.access(self.root, os.W_OK)
@@ -1,138 +1,281 @@
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
-from app.utils.embeddings import embed_texts
-from app.utils.vectorstore import qdrant_client
+from app.utils.embeddings import embed_query, embed_texts_cached
+from app.utils.vectorstore import search_vectors, search_lexical as search_lexical_index, hybrid_available
 from app.utils.llm import generate_response_stream
-from app.utils.supabase_client import supabase
+from app.utils.supabase_client import get_supabase
+from app.utils.delta_publisher import DeltaPublisher
+from app.utils.answer_cache import answer_cache
+from app.utils.reranker import reranker
+from app.utils.lexical import rrf_fuse
+from app.utils.diversity import mmr_order, merge_into_span
+from app.utils.context_packer import pack_context, token_estimator
+from app.config import (
+    EVENT_BACKEND, EVENT_STREAM_MAXLEN, EVENT_STREAM_TTL_SECONDS, SEMANTIC_CACHE_ENABLED, DELTA_FLUSH_CHARS,
+    HYBRID_CANDIDATES, HYBRID_LEXICAL_BYPASS_RANKS, RERANK_CANDIDATES, MMR_ENABLED, MMR_CANDIDATES,
+)
+import numpy as np
 import uuid
 
 # Retrieval tuning
 RETRIEVAL_MIN_SCORE = 0.65  # raw vector similarity floor; raise to be more strict
 MAX_CITATIONS = 5  # how many citations to include in the prompt/context
-# Subscriber wait
+# Subscriber wait (pubsub backend only; the streams backend replays missed events)
 SUBSCRIBER_WAIT_SECONDS = 2  # how long orchestrator waits for an SSE subscriber to connect
 
+COLLECTION_NAME = "documents_chunks"
+# Runs the dense and lexical legs of a hybrid search side by side
+_retrieval_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
 
 class Orchestrator:
     """Simple orchestrator that runs tools and publishes events via Redis.
 
     This is intentionally minimal: tools are executed sequentially and publish
-    events to a Redis channel named `conversation:{conversation_id}`.
+    events either to the Redis Stream `conversation:{conversation_id}:events`
+    (EVENT_BACKEND="streams") or to the pub/sub channel
+    `conversation:{conversation_id}` (EVENT_BACKEND="pubsub").
     """
     def __init__(self, redis_client):
         self.redis = redis_client
 
     def publish(self, conversation_id: str, event_type: str, data: dict):
+        if EVENT_BACKEND == "streams":
+            # Store type and pre-encoded data as separate fields so the SSE side
+            # can frame entries without decoding them again.
+            self.redis.xadd(
+                f"conversation:{conversation_id}:events",
+                {"type": event_type, "data": json.dumps(data, ensure_ascii=False)},
+                maxlen=EVENT_STREAM_MAXLEN,
+                approximate=True,
+            )
+            return
         channel = f"conversation:{conversation_id}"
         payload = {"type": event_type, "data": data}
         self.redis.publish(channel, json.dumps(payload, ensure_ascii=False))
 
-    def search_documents(self, query: str, top_k: int = 5) -> List[dict]:
-        # Embed and run vector search
-        qv = embed_texts([query])[0]
-        # use query_points() on this QdrantClient version
-        # Some qdrant-client versions expect the vector as a positional
-        # argument rather than a keyword named `query_vector`. Pass the
-        # collection name first and the vector second to be maximally
-        # compatible across client versions.
-        try:
-            results = qdrant_client.query_points(
-                "documents_chunks",
-                qv,
-                limit=top_k,
-                with_payload=True,
-            )
-        except TypeError:
-            # Fallback: try older/newer signature variations
-            try:
-                results = qdrant_client.query_points(
-                    collection_name="documents_chunks",
-                    query=qv,
-                    limit=top_k,
-                    with_payload=True,
-                )
-            except Exception as e:
-                # Final fallback: re-raise to be handled by caller
-                raise
-
-        # qdrant-client may return different shapes depending on version:
-        # - QueryResponse object with .points list
-        # - an object with attributes 'result' or 'hits'
-        # - a tuple like ("points", [ScoredPoint, ...])
-        # - a dict/wrapper containing the list
-        # - directly a list of ScoredPoint
-        # Normalize to a list of hits (ScoredPoint-like objects)
-        hits = None
-
-        # QueryResponse-like
-        if hasattr(results, "points") and isinstance(results.points, list):
-            hits = results.points
-        elif hasattr(results, "result") and isinstance(results.result, list):
-            hits = results.result
-        elif hasattr(results, "hits") and isinstance(results.hits, list):
-            hits = results.hits
-
-        # Tuple shape: ("points", [...])
-        elif isinstance(results, tuple) and len(results) >= 2 and isinstance(results[1], list):
-            hits = results[1]
-
-        # Dict-like wrapper
-        elif isinstance(results, dict):
-            for k in ("result", "points", "hits"):
-                if k in results and isinstance(results[k], list):
-                    hits = results[k]
-                    break
+    def begin_turn(self, conversation_id: str):
+        """Record where the upcoming turn starts in the conversation's event stream.
 
-        # Direct list
-        elif isinstance(results, list):
-            hits = results
+        Must be called before `run` is scheduled. A client that connects without
+        `Last-Event-ID` while the turn is in flight reads from this cursor, so it
+        also receives events published before it subscribed.
+        """
+        if EVENT_BACKEND != "streams":
+            return
+        key = f"conversation:{conversation_id}:events"
+        try:
+            latest = self.redis.xrevrange(key, count=1)
+            cursor = latest[0][0] if latest else "0-0"
+            self.redis.set(f"conversation:{conversation_id}:turn", cursor, ex=EVENT_STREAM_TTL_SECONDS)
+        except Exception as e:
+            print(f"[Orchestrator] Warning: failed to record turn cursor: {e}")
 
-        if hits is None:
-            # Fallback: log the type and available attributes to help debugging
-            attrs = [a for a in dir(results) if not a.startswith("_")][:50]
-            print(f"[Orchestrator] Unrecognized qdrant query result shape: {type(results)} -> available attrs: {attrs}")
-            return []
+    def end_turn(self, conversation_id: str):
+        """Clear the turn cursor and refresh the event stream's TTL."""
+        if EVENT_BACKEND != "streams":
+            return
+        try:
+            self.redis.delete(f"conversation:{conversation_id}:turn")
+            self.redis.expire(f"conversation:{conversation_id}:events", EVENT_STREAM_TTL_SECONDS)
+        except Exception:
+            pass
 
-        return hits
+    def wait_for_subscriber(self, conversation_id: str):
+        """Poll the subscriber flag for up to SUBSCRIBER_WAIT_SECONDS (pubsub backend)."""
+        try:
+            sub_key = f"conversation:{conversation_id}:subscribed"
+            waited = 0.0
+            interval = 0.1
+            found = False
+            while waited < SUBSCRIBER_WAIT_SECONDS:
+                try:
+                    if self.redis.get(sub_key):
+                        found = True
+                        break
+                except Exception:
+                    # If Redis check fails, bail out
+                    break
+                time.sleep(interval)
+                waited += interval
+            if not found:
+                # publish an info event so client knows there was no subscriber at start
+                self.publish(conversation_id, "info", {"message": "No SSE subscriber detected before generation."})
+        except Exception:
+            pass
+
+    def search_documents(self, query: str, top_k: int = 5, query_vector: List[float] | None = None, with_vectors: bool = False,
+                         doc_ids: List[str] | None = None) -> List:
+        # Embed (micro-batched with concurrent turns) and run vector search,
+        # filtered on the indexed doc_id payload field when the conversation is scoped
+        qv = query_vector if query_vector is not None else embed_query(query)
+        return search_vectors(COLLECTION_NAME, qv, limit=top_k, doc_ids=doc_ids, with_vectors=with_vectors)
+
+    def search_lexical(self, query: str, top_k: int = 5, doc_ids: List[str] | None = None) -> List:
+        """BM25 search over the sparse index; [] if the query has no usable terms."""
+        return search_lexical_index(COLLECTION_NAME, query, limit=top_k, doc_ids=doc_ids)
+
+    def retrieve(self, query: str, top_k: int = 5, query_vector: List[float] | None = None, with_vectors: bool = False,
+                 doc_ids: List[str] | None = None):
+        """Return (hits, stats) from hybrid dense + lexical retrieval.
+
+        Both legs fetch HYBRID_CANDIDATES hits concurrently and are merged with
+        reciprocal rank fusion. Hits are dicts with the payload, the dense
+        similarity as `score` (None for lexical-only hits), each leg's rank and,
+        with `with_vectors`, the dense vector (None for lexical-only hits).
+        With HYBRID_SEARCH_ENABLED off, or a backend without a sparse index,
+        this is plain dense search. `doc_ids` restricts both legs to those documents.
+        """
+        if not hybrid_available():
+            start = time.perf_counter()
+            hits = self.search_documents(query, top_k=top_k, query_vector=query_vector, with_vectors=with_vectors, doc_ids=doc_ids)
+            return hits, {"mode": "dense", "dense_ms": round((time.perf_counter() - start) * 1000, 1), "dense_hits": len(hits)}
+
+        def timed(fn, *args, **kwargs):
+            start = time.perf_counter()
+            return fn(*args, **kwargs), round((time.perf_counter() - start) * 1000, 1)
+
+        dense_fut = _retrieval_pool.submit(timed, self.search_documents, query, top_k=max(HYBRID_CANDIDATES, top_k), query_vector=query_vector,
+                                           with_vectors=with_vectors, doc_ids=doc_ids)
+        lexical_fut = _retrieval_pool.submit(timed, self.search_lexical, query, top_k=HYBRID_CANDIDATES, doc_ids=doc_ids)
+        dense_hits, dense_ms = dense_fut.result()
+        try:
+            lexical_hits, lexical_ms = lexical_fut.result()
+        except Exception as e:
+            # e.g. sparse collection not created yet; dense results are still usable
+            print(f"[Orchestrator] Warning: lexical search failed: {e}")
+            lexical_hits, lexical_ms = [], None
+
+        fused = rrf_fuse({"dense": dense_hits, "lexical": lexical_hits}, limit=top_k)
+        hits = [
+            {
+                "id": e["hit"].id,
+                "payload": e["hit"].payload,
+                "score": e["scores"].get("dense"),
+                "rrf_score": e["rrf_score"],
+                "dense_rank": e["ranks"].get("dense"),
+                "lexical_rank": e["ranks"].get("lexical"),
+                "vector": getattr(e["hit"], "vector", None),
+            }
+            for e in fused
+        ]
+        stats = {
+            "mode": "hybrid",
+            "dense_ms": dense_ms,
+            "lexical_ms": lexical_ms,
+            "dense_hits": len(dense_hits),
+            "lexical_hits": len(lexical_hits),
+            "fused": len(hits),
+            "both": sum(1 for h in hits if h["dense_rank"] and h["lexical_rank"]),
+            "lexical_only": sum(1 for h in hits if not h["dense_rank"]),
+        }
+        print(f"[Orchestrator] Hybrid retrieval: {stats}")
+        return hits, stats
+
+    def select_diverse(self, candidates: List[dict]):
+        """Choose up to MAX_CITATIONS citation spans by MMR; returns (spans, stats).
+
+        Relevance comes from the incoming order, which already reflects fusion
+        and reranking, so MMR only trades it off against redundancy. Candidates
+        overlapping an already chosen span of the same page are merged into it
+        instead of taking a slot of their own.
+        """
+        n = len(candidates)
+        # Lexical-only hits come without a vector; their chunk text is normally in the embedding cache
+        missing = [i for i, c in enumerate(candidates) if c.get("vector") is None]
+        if missing:
+            texts = [candidates[i]["payload"].get("text") or candidates[i]["payload"].get("text_snippet") or "" for i in missing]
+            fresh, _ = embed_texts_cached(texts)
+            for i, vec in zip(missing, fresh):
+                candidates[i]["vector"] = vec
+
+        relevance = 1.0 - np.arange(n) / n
+        spans = []
+        merged = 0
+        for i in mmr_order([c["vector"] for c in candidates], relevance):
+            if merge_into_span(spans, candidates[i]):
+                merged += 1
+            elif len(spans) < MAX_CITATIONS:
+                spans.append(dict(candidates[i]))
+            else:
+                break
+        return spans, {"candidates": n, "selected": len(spans), "merged": merged, "embedded": len(missing)}
 
-    def run(self, conversation_id: str, user_message: str):
+    def persist_assistant_message(self, conversation_id: str, content: str, citation_map: List[dict] | None):
+        """Persist final assistant message to Supabase so conversation history is complete."""
+        try:
+            # Build metadata (include citation_map if available)
+            metadata = {}
+            if citation_map:
+                metadata['citation_map'] = citation_map
+
+            assistant_message_id = str(uuid.uuid4())
+            get_supabase().table("messages").insert({
+                "message_id": assistant_message_id,
+                "conversation_id": conversation_id,
+                "role": "assistant",
+                "content": content,
+                "metadata": metadata
+            }).execute()
+        except Exception as e:
+            # Non-fatal: log and continue (do not break the orchestration on DB failures)
+            print(f"[Orchestrator] Warning: failed to persist assistant message: {e}")
+
+    def replay_cached_answer(self, conversation_id: str, entry: dict):
+        """Publish a cached answer using the same event sequence as a live turn."""
+        citation_map = entry["citation_map"]
+        self.publish(conversation_id, "tool_call_started", {"tool": "search_documents"})
+        self.publish(conversation_id, "citation_map", {"map": citation_map})
+        for cm in citation_map:
+            self.publish(conversation_id, "citation", cm)
+        self.publish(conversation_id, "tool_call_finished", {"tool": "search_documents", "count": len(citation_map), "cached": True})
+
+        self.publish(conversation_id, "tool_call_started", {"tool": "generate_answer"})
+        answer = entry["answer"]
+        for i in range(0, len(answer), DELTA_FLUSH_CHARS):
+            self.publish(conversation_id, "text_delta", {"delta": answer[i:i + DELTA_FLUSH_CHARS]})
+        self.persist_assistant_message(conversation_id, answer, citation_map)
+        self.publish(conversation_id, "tool_call_finished", {"tool": "generate_answer", "cached": True, "similarity": round(entry["similarity"], 4)})
+
+    def run(self, conversation_id: str, user_message: str, doc_ids: List[str] | None = None):
+        """Answer one turn; `doc_ids` (the conversation's scope) restricts retrieval to those documents."""
         # Wrap orchestration in try/except so we always publish a terminal event
         try:
-            # Wait briefly for a subscriber to connect (to avoid missed initial events)
-            try:
-                sub_key = f"conversation:{conversation_id}:subscribed"
-                waited = 0.0
-                interval = 0.1
-                found = False
-                while waited < SUBSCRIBER_WAIT_SECONDS:
-                    try:
-                        if self.redis.get(sub_key):
-                            found = True
-                            break
-                    except Exception:
-                        # If Redis check fails, bail out
-                        break
-                    time.sleep(interval)
-                    waited += interval
-                if not found:
-                    # publish an info event so client knows there was no subscriber at start
-                    self.publish(conversation_id, "info", {"message": "No SSE subscriber detected before generation."})
-            except Exception:
-                pass
+            # Wait briefly for a subscriber to connect (to avoid missed initial events).
+            # Not needed with the streams backend: late subscribers replay from the turn cursor.
+            if EVENT_BACKEND != "streams":
+                self.wait_for_subscriber(conversation_id)
 
             # 1) Typing start
             self.publish(conversation_id, "typing", {"status": "started"})
 
+            query_vector = embed_query(user_message)
+
+            # Near-duplicate of a recently answered question: replay it instead of
+            # running retrieval and generation again
+            if SEMANTIC_CACHE_ENABLED:
+                cached = answer_cache.lookup(query_vector, scope=doc_ids)
+                if cached:
+                    print(f"[Orchestrator] Semantic cache hit (similarity={cached['similarity']:.3f}) for: {cached['query'][:80]}")
+                    self.replay_cached_answer(conversation_id, cached)
+                    return
+
             # 2) Tool: search_documents
             self.publish(conversation_id, "tool_call_started", {"tool": "search_documents"})
-            results = self.search_documents(user_message, top_k=5)
+            # The reranker and MMR pick MAX_CITATIONS out of a wider candidate set
+            rerank_active = reranker.active()
+            top_k = max(RERANK_CANDIDATES if rerank_active else 5, MMR_CANDIDATES if MMR_ENABLED else 5)
+            results, retrieval_stats = self.retrieve(user_message, top_k=top_k, query_vector=query_vector, with_vectors=MMR_ENABLED, doc_ids=doc_ids)
+            if doc_ids:
+                retrieval_stats["scope_docs"] = len(doc_ids)
 
             # Emit citations for results
             citations = []
             if not results:
                 # No hits found
-                self.publish(conversation_id, "tool_call_finished", {"tool": "search_documents", "count": 0})
+                self.publish(conversation_id, "tool_call_finished", {"tool": "search_documents", "count": 0, "retrieval": retrieval_stats})
                 self.publish(conversation_id, "info", {"message": "No relevant documents found"})
             else:
                     candidates = []
@@ -163,26 +306,53 @@ class Orchestrator:
                             except Exception:
                                 raw_score = None
 
-                        candidates.append({"hit": hit, "payload": payload, "score": raw_score})
+                        lexical_rank = hit.get("lexical_rank") if isinstance(hit, dict) else None
+                        vector = hit.get("vector") if isinstance(hit, dict) else getattr(hit, "vector", None)
+                        candidates.append({"hit": hit, "payload": payload, "score": raw_score, "lexical_rank": lexical_rank, "vector": vector})
 
-                    # Filter by raw similarity score to reduce noisy results
-                    filtered = [c for c in candidates if (c.get("score") is not None and c["score"] >= RETRIEVAL_MIN_SCORE)]
+                    # Filter by raw similarity score to reduce noisy results. The best few lexical
+                    # matches are kept regardless: exact terms (part numbers, names, codes) are what
+                    # the dense similarity floor used to discard. Lower lexical ranks often share
+                    # just one common term with the query, so they have to pass the floor too.
+                    filtered = [
+                        c for c in candidates
+                        if (c.get("score") is not None and c["score"] >= RETRIEVAL_MIN_SCORE)
+                        or (c.get("lexical_rank") and c["lexical_rank"] <= HYBRID_LEXICAL_BYPASS_RANKS)
+                    ]
 
                     # If filtering removed everything, we can be more permissive and keep top results
                     if not filtered and candidates:
                         # sort candidates by score (None -> -inf)
                         candidates.sort(key=lambda x: x.get("score") or -1, reverse=True)
-                        # keep top MAX_CITATIONS but still mark they are low confidence
-                        filtered = candidates[:MAX_CITATIONS]
+                        # keep top MAX_CITATIONS (or all of them for the reranker/MMR to choose from) but still mark they are low confidence
+                        filtered = candidates if (rerank_active or MMR_ENABLED) else candidates[:MAX_CITATIONS]
                         self.publish(conversation_id, "info", {"message": "Low-confidence results returned (below similarity threshold)"})
 
-                    # Build citation map from filtered candidates (limit to MAX_CITATIONS)
+                    if rerank_active:
+                        # With MMR on, the reranker only reorders; MMR makes the final cut
+                        top_n = len(filtered) if MMR_ENABLED else MAX_CITATIONS
+                        filtered, retrieval_stats["rerank"] = reranker.rerank(user_message, filtered, top_n)
+
+                    if MMR_ENABLED and filtered:
+                        filtered, retrieval_stats["mmr"] = self.select_diverse(filtered)
+
+                    # Fit the best-ranked spans into the context token budget; spans that
+                    # don't make it into the prompt are not offered as citations either
+                    top = filtered[:MAX_CITATIONS]
+                    packed, packing_stats = pack_context(
+                        [(idx, c["payload"].get("text") or c["payload"].get("text_snippet")) for idx, c in enumerate(top)]
+                    )
+                    context_snippets = []
+
+                    # Build citation map from the packed candidates (limit to MAX_CITATIONS)
                     citation_map = []
-                    for idx, c in enumerate(filtered[:MAX_CITATIONS], start=1):
+                    for idx, (pos, text) in enumerate(packed, start=1):
+                        c = top[pos]
                         p = c["payload"]
-                        excerpt = (p.get("text") or "")
-                        # truncate excerpt for prompt
+                        excerpt = (p.get("text") or p.get("text_snippet") or "")
+                        # short excerpt for the UI; the prompt gets the packed text
                         excerpt_short = excerpt[:1000]
+                        context_snippets.append((idx, text))
                         citation_map.append({
                             "id": idx,
                             "doc_id": p.get("doc_id"),
@@ -191,6 +361,7 @@ class Orchestrator:
                             "end_offset": p.get("end_offset"),
                             "text_snippet": excerpt_short,
                             "score": c.get("score"),
+                            "rerank_score": c.get("rerank_score"),
                         })
 
                     # Publish citation_map so UI can map markers to source locations
@@ -200,18 +371,16 @@ class Orchestrator:
                         for cm in citation_map:
                             self.publish(conversation_id, "citation", cm)
 
-                    self.publish(conversation_id, "tool_call_finished", {"tool": "search_documents", "count": len(citation_map)})
+                    self.publish(conversation_id, "tool_call_finished", {"tool": "search_documents", "count": len(citation_map), "retrieval": retrieval_stats})
 
             # 3) Tool: generate_answer (we'll call LLM and stream deltas)
-            self.publish(conversation_id, "tool_call_started", {"tool": "generate_answer"})
-
-            # Build a prompt using the numbered citation_map snippets and instruct the LLM to cite using bracketed numbers.
-            # citation_map is a list of dicts with keys: id, text_snippet, doc_id, page_number, start_offset, end_offset
+            # Build a prompt using the numbered, token-budgeted snippets and instruct the LLM to cite using bracketed numbers.
+            # context_snippets holds (citation id, packed text) pairs aligned with citation_map
             context_parts = []
             if 'citation_map' in locals() and citation_map:
-                for cm in citation_map[:MAX_CITATIONS]:
-                    marker = f"[{cm['id']}]"
-                    context_parts.append(f"{marker} {cm['text_snippet']}")
+                for cid, text in context_snippets:
+                    marker = f"[{cid}]"
+                    context_parts.append(f"{marker} {text}")
                 context = "\n\n".join(context_parts)
                 prompt = f"You are an assistant that answers questions using only the provided numbered context snippets. " \
                          f"Cite snippets inline using their bracketed number (for example: [1], [2]). If multiple citations for the same information are needed, include all relevant bracketed numbers (for example: [1][2]). " \
@@ -220,43 +389,56 @@ class Orchestrator:
                 # No snippets available
                 prompt = f"You are an assistant. There is no supporting context available. If you cannot answer the question based on general knowledge, say you don't know.\n\nQuestion: {user_message}\n\nAnswer:"
 
-            # Call LLM with streaming and publish token-level deltas as they arrive
+            prompt_tokens = token_estimator.estimate(prompt)
+            self.publish(conversation_id, "tool_call_started", {
+                "tool": "generate_answer",
+                "prompt_tokens": prompt_tokens,
+                "context": packing_stats if 'packing_stats' in locals() else None,
+            })
+
+            # Call LLM with streaming and publish deltas, coalesced into fewer events
             assistant_buffer = ""
-            for delta in generate_response_stream([{"role": "user", "content": prompt}]):
-                # delta may be a short token or string fragment
-                try:
-                    if isinstance(delta, str):
-                        assistant_buffer += delta
-                    else:
-                        # try to coerce to string when possible
-                        assistant_buffer += str(delta)
-                except Exception:
-                    # ignore non-stringable chunks
-                    pass
+            deltas = DeltaPublisher(self.publish, conversation_id)
+            usage = {}
+            try:
+                for delta in generate_response_stream([{"role": "user", "content": prompt}], usage=usage):
+                    # delta may be a short token or string fragment
+                    try:
+                        if not isinstance(delta, str):
+                            # try to coerce to string when possible
+                            delta = str(delta)
+                    except Exception:
+                        # ignore non-stringable chunks
+                        continue
 
-                self.publish(conversation_id, "text_delta", {"delta": delta})
+                    assistant_buffer += delta
+                    deltas.add(delta)
+            finally:
+                # Publish whatever is still buffered, even if the LLM stream failed mid-way
+                deltas.flush()
 
-            # Persist final assistant message to Supabase so conversation history is complete
-            try:
-                # Build metadata (include citation_map if available)
-                metadata = {}
-                if 'citation_map' in locals() and citation_map:
-                    metadata['citation_map'] = citation_map
-
-                assistant_message_id = str(uuid.uuid4())
-                supabase.table("messages").insert({
-                    "message_id": assistant_message_id,
-                    "conversation_id": conversation_id,
-                    "role": "assistant",
-                    "content": assistant_buffer,
-                    "metadata": metadata
-                }).execute()
-            except Exception as e:
-                # Non-fatal: log and continue (do not break the orchestration on DB failures)
-                print(f"[Orchestrator] Warning: failed to persist assistant message: {e}")
+            final_citation_map = citation_map if 'citation_map' in locals() else None
+            self.persist_assistant_message(conversation_id, assistant_buffer, final_citation_map)
+
+            if SEMANTIC_CACHE_ENABLED:
+                answer_cache.store(user_message, query_vector, assistant_buffer, final_citation_map, scope=doc_ids)
+
+            # Calibrate the token estimate against the model's own count
+            if usage.get("prompt_tokens"):
+                token_estimator.observe(prompt, usage["prompt_tokens"])
 
             # Finish tool
-            self.publish(conversation_id, "tool_call_finished", {"tool": "generate_answer"})
+            delta_stats = deltas.stats()
+            print(f"[Orchestrator] text_delta: {delta_stats['fragments']} fragments in {delta_stats['flushes']} events; "
+                  f"prompt tokens est={prompt_tokens} actual={usage.get('prompt_tokens')}")
+            self.publish(conversation_id, "tool_call_finished", {
+                "tool": "generate_answer",
+                "delta_fragments": delta_stats["fragments"],
+                "delta_events": delta_stats["flushes"],
+                "prompt_tokens": usage.get("prompt_tokens", prompt_tokens),
+                "prompt_tokens_estimated": prompt_tokens,
+                "output_tokens": usage.get("output_tokens"),
+            })
 
         except Exception as e:
             # Publish error so clients can stop waiting
@@ -268,3 +450,4 @@ class Orchestrator:
             # Ensure typing stopped and done event always published
             self.publish(conversation_id, "typing", {"status": "stopped"})
             self.publish(conversation_id, "done", {"finished": True})
+            self.end_turn(conversation_id)
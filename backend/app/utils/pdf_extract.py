@@ -0,0 +1,30 @@
+# Page-range extraction for the parallel PDF path. Kept free of app imports so
+# unpickling the task pulls in nothing beyond pdfplumber. Note that spawned pool
+# processes still re-import the parent's main module (e.g. app.workers.ingestion_worker,
+# and with it app.config and app.utils.embeddings); the clients and the embedding
+# model are created lazily, so the children don't connect or load the model.
+import pdfplumber
+from typing import List
+
+
+def extract_page_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+    finally:
+        # pdfplumber caches layout objects on the page; drop them so memory
+        # stays flat for large documents
+        page.close()
+
+
+def count_pages(file_path: str) -> int:
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Return texts for 0-based pages [start, end), opening the file independently."""
+    # pdfplumber's `pages` argument is 1-based
+    with pdfplumber.open(file_path, pages=list(range(start + 1, end + 1))) as pdf:
+        return [extract_page_text(page) for page in pdf.pages]
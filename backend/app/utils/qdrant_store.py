@@ -0,0 +1,222 @@
+from qdrant_client.models import (
+    PointStruct, Filter, FieldCondition, MatchValue, MatchAny, FilterSelector, PointIdsList,
+    VectorParams, Distance, HnswConfigDiff, ScalarQuantization, ScalarQuantizationConfig, ScalarType, PayloadSchemaType,
+    SparseVector, SparseVectorParams, Modifier, QueryRequest,
+)
+from app.utils.vectorstore import VectorStore
+from app.utils.lexical import SPARSE_VECTOR_NAME, sparse_collection_name, document_sparse_vector, query_sparse_vector
+from app.config import (
+    get_qdrant,
+    get_search_params,
+    HYBRID_SEARCH_ENABLED,
+    QDRANT_HNSW_M,
+    QDRANT_HNSW_EF_CONSTRUCT,
+    QDRANT_SCALAR_QUANTIZATION,
+    QDRANT_ON_DISK_PAYLOAD,
+)
+
+# Payload fields that searches and deletes filter on
+PAYLOAD_INDEXES = {
+    "doc_id": PayloadSchemaType.KEYWORD,
+    "page_number": PayloadSchemaType.INTEGER,
+}
+
+
+def _doc_filter(doc_id):
+    return Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))])
+
+def _docs_filter(doc_ids):
+    if not doc_ids:
+        return None
+    return Filter(must=[FieldCondition(key="doc_id", match=MatchAny(any=list(doc_ids)))])
+
+def _hits_of(results):
+    """Normalize a query_points response to a list of ScoredPoint-like hits."""
+    # qdrant-client may return different shapes depending on version:
+    # - QueryResponse object with .points list
+    # - an object with attributes 'result' or 'hits'
+    # - a tuple like ("points", [ScoredPoint, ...])
+    # - a dict/wrapper containing the list
+    # - directly a list of ScoredPoint
+    if hasattr(results, "points") and isinstance(results.points, list):
+        return results.points
+    if hasattr(results, "result") and isinstance(results.result, list):
+        return results.result
+    if hasattr(results, "hits") and isinstance(results.hits, list):
+        return results.hits
+    if isinstance(results, tuple) and len(results) >= 2 and isinstance(results[1], list):
+        return results[1]
+    if isinstance(results, dict):
+        for k in ("result", "points", "hits"):
+            if k in results and isinstance(results[k], list):
+                return results[k]
+    if isinstance(results, list):
+        return results
+
+    # Log the type and available attributes to help debugging
+    attrs = [a for a in dir(results) if not a.startswith("_")][:50]
+    print(f"[Qdrant] Unrecognized query result shape: {type(results)} -> available attrs: {attrs}")
+    return []
+
+
+class QdrantVectorStore(VectorStore):
+    """Qdrant server backend. With hybrid search on, every collection has a
+    `<name>_sparse` companion holding BM25 sparse vectors for the same points."""
+
+    supports_sparse = True
+
+    def _with_sparse(self, collection_name):
+        return [collection_name, sparse_collection_name(collection_name)] if HYBRID_SEARCH_ENABLED else [collection_name]
+
+    def init_collection(self, name, vector_size):
+        """Create the collection if it doesn't exist, then make sure its payload indexes exist.
+
+        An existing collection is never recreated, so restarting workers keeps the
+        index. HNSW, quantization and on-disk payload settings only apply at creation.
+        """
+        client = get_qdrant()
+        try:
+            if client.collection_exists(name):
+                print(f"[Qdrant] Using existing collection '{name}'")
+            else:
+                quantization = None
+                if QDRANT_SCALAR_QUANTIZATION:
+                    quantization = ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+                client.create_collection(
+                    collection_name=name,
+                    vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+                    hnsw_config=HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT),
+                    quantization_config=quantization,
+                    on_disk_payload=QDRANT_ON_DISK_PAYLOAD,
+                )
+                print(f"[Qdrant] Created collection '{name}' (m={QDRANT_HNSW_M}, ef_construct={QDRANT_HNSW_EF_CONSTRUCT}, int8={QDRANT_SCALAR_QUANTIZATION})")
+
+            # Idempotent; also adds the indexes to collections created before they existed
+            for field, schema in PAYLOAD_INDEXES.items():
+                client.create_payload_index(collection_name=name, field_name=field, field_schema=schema)
+        except Exception as e:
+            print("Exception in creating collection: ",e)
+
+        if HYBRID_SEARCH_ENABLED:
+            self.init_sparse_collection(name)
+
+    def init_sparse_collection(self, name):
+        """Create the companion BM25 collection for `name` if missing; Qdrant applies the IDF."""
+        client = get_qdrant()
+        sparse_name = sparse_collection_name(name)
+        try:
+            if not client.collection_exists(sparse_name):
+                client.create_collection(
+                    collection_name=sparse_name,
+                    vectors_config={},
+                    sparse_vectors_config={SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)},
+                    on_disk_payload=QDRANT_ON_DISK_PAYLOAD,
+                )
+                print(f"[Qdrant] Created sparse collection '{sparse_name}'")
+            for field, schema in PAYLOAD_INDEXES.items():
+                client.create_payload_index(collection_name=sparse_name, field_name=field, field_schema=schema)
+        except Exception as e:
+            print("Exception in creating sparse collection: ",e)
+
+    def upsert(self, collection_name, vectors, payloads, ids, wait=True):
+        points = [PointStruct(id=i, vector=v, payload=p) for i, v, p in zip(ids, vectors, payloads)]
+        get_qdrant().upsert(collection_name=collection_name, points=points, wait=wait)
+
+    def upsert_sparse(self, collection_name, payloads, ids, wait=True):
+        points = []
+        for i, p in zip(ids, payloads):
+            indices, values = document_sparse_vector(p.get("text") or p.get("text_snippet") or "")
+            if indices:
+                points.append(PointStruct(id=i, vector={SPARSE_VECTOR_NAME: SparseVector(indices=indices, values=values)}, payload=p))
+            # chunks without any token are simply absent from the lexical index
+        if points:
+            get_qdrant().upsert(collection_name=sparse_collection_name(collection_name), points=points, wait=wait)
+
+    def search(self, collection_name, vector, limit, doc_ids=None, with_vectors=False):
+        try:
+            # Some qdrant-client versions expect the vector as a positional
+            # argument rather than a keyword
+            results = get_qdrant().query_points(
+                collection_name,
+                vector,
+                limit=limit,
+                query_filter=_docs_filter(doc_ids),
+                with_payload=True,
+                with_vectors=with_vectors,
+                search_params=get_search_params(),
+            )
+        except TypeError:
+            results = get_qdrant().query_points(
+                collection_name=collection_name,
+                query=vector,
+                limit=limit,
+                query_filter=_docs_filter(doc_ids),
+                with_payload=True,
+                with_vectors=with_vectors,
+                search_params=get_search_params(),
+            )
+        return _hits_of(results)
+
+    def search_batch(self, collection_name, vectors, limit, doc_ids=None):
+        # One round trip for all queries instead of one query_points call each
+        query_filter = _docs_filter(doc_ids)
+        requests = [
+            QueryRequest(
+                query=list(vector),
+                limit=limit,
+                filter=query_filter,
+                with_payload=True,
+                params=get_search_params(),
+            )
+            for vector in vectors
+        ]
+        responses = get_qdrant().query_batch_points(collection_name=collection_name, requests=requests)
+        return [_hits_of(r) for r in responses]
+
+    def search_sparse(self, collection_name, text, limit, doc_ids=None):
+        indices, values = query_sparse_vector(text)
+        if not indices:
+            return []
+        results = get_qdrant().query_points(
+            collection_name=sparse_collection_name(collection_name),
+            query=SparseVector(indices=indices, values=values),
+            using=SPARSE_VECTOR_NAME,
+            limit=limit,
+            query_filter=_docs_filter(doc_ids),
+            with_payload=True,
+        )
+        return _hits_of(results)
+
+    def count(self, collection_name, doc_id):
+        return get_qdrant().count(collection_name=collection_name, count_filter=_doc_filter(doc_id), exact=True).count
+
+    def delete_document(self, collection_name, doc_id):
+        for name in self._with_sparse(collection_name):
+            get_qdrant().delete(
+                collection_name=name,
+                points_selector=FilterSelector(filter=_doc_filter(doc_id)),
+            )
+
+    def scroll_document(self, collection_name, doc_id, payload_fields, page_size=1000):
+        points = []
+        offset = None
+        while True:
+            batch, offset = get_qdrant().scroll(
+                collection_name=collection_name,
+                scroll_filter=_doc_filter(doc_id),
+                with_payload=payload_fields,
+                with_vectors=False,
+                limit=page_size,
+                offset=offset,
+            )
+            points.extend((p.id, p.payload or {}) for p in batch)
+            if offset is None:
+                return points
+
+    def delete_ids(self, collection_name, ids):
+        for name in self._with_sparse(collection_name):
+            get_qdrant().delete(collection_name=name, points_selector=PointIdsList(points=list(ids)), wait=True)
+
+    def healthy(self):
+        get_qdrant().get_collections()
+        return True
@@ -0,0 +1,175 @@
+import hashlib
+import threading
+import time
+from app.config import (
+    get_redis,
+    lazy_singleton,
+    RERANK_ENABLED,
+    RERANK_MODEL,
+    RERANK_CACHE_TTL_SECONDS,
+    RERANK_BUDGET_MS,
+    RERANK_MAX_OVER_BUDGET,
+    RERANK_COOLDOWN_SECONDS,
+)
+from app.utils.embedding_cache import normalize_query
+
+MAX_PASSAGE_CHARS = 2000  # the cross-encoder truncates at 512 tokens anyway
+
+
+@lazy_singleton
+def get_rerank_model():
+    # Imported here: pulling in torch dominates import time
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANK_MODEL, max_length=512)
+
+
+def candidate_id(candidate: dict) -> str:
+    """Stable chunk id of a retrieval candidate (payload chunk_id, else the point id)."""
+    payload = candidate.get("payload") or {}
+    if payload.get("chunk_id"):
+        return str(payload["chunk_id"])
+    hit = candidate.get("hit")
+    return str(hit.get("id") if isinstance(hit, dict) else getattr(hit, "id", ""))
+
+
+def candidate_text(candidate: dict) -> str:
+    payload = candidate.get("payload") or {}
+    return (payload.get("text") or payload.get("text_snippet") or "")[:MAX_PASSAGE_CHARS]
+
+
+class Reranker:
+    """Re-order retrieval candidates with a cross-encoder, within a latency budget.
+
+    All uncached (query, chunk) pairs of a turn are scored in one batched
+    forward pass. Scores are cached in a Redis hash per query
+    (`rerank:{query hash}` -> {chunk_id: score}). A turn that takes longer than
+    `budget_ms` counts as a strike; after `max_over_budget` consecutive strikes
+    the stage switches itself off for `cooldown_seconds`, after which it is
+    tried again.
+    """
+
+    def __init__(self, enabled: bool = RERANK_ENABLED, budget_ms: float = RERANK_BUDGET_MS,
+                 max_over_budget: int = RERANK_MAX_OVER_BUDGET, cooldown_seconds: float = RERANK_COOLDOWN_SECONDS):
+        self.enabled = enabled
+        self.budget_ms = budget_ms
+        self.max_over_budget = max_over_budget
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._strikes = 0
+        self._disabled_until = 0.0
+        # Counters
+        self.calls = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+        self.over_budget = 0
+        self.auto_disabled = 0
+        self.total_ms = 0.0
+        self.last_ms = None
+
+    def active(self) -> bool:
+        return self.enabled and time.monotonic() >= self._disabled_until
+
+    def warmup(self):
+        """Load the model ahead of the first turn so it doesn't count against the budget."""
+        if self.enabled:
+            get_rerank_model().predict([("warmup", "warmup")], show_progress_bar=False)
+
+    def _cache_key(self, query: str) -> str:
+        digest = hashlib.sha256(f"{RERANK_MODEL}\0{normalize_query(query)}".encode("utf-8")).hexdigest()
+        return f"rerank:{digest}"
+
+    def _cached_scores(self, key: str, ids: list) -> list:
+        try:
+            values = get_redis().hmget(key, ids)
+        except Exception as e:
+            print(f"[Reranker] Redis hmget failed: {e}")
+            return [None] * len(ids)
+        return [float(v) if v is not None else None for v in values]
+
+    def _store_scores(self, key: str, scores: dict):
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.hset(key, mapping=scores)
+            pipe.expire(key, RERANK_CACHE_TTL_SECONDS)
+            pipe.execute()
+        except Exception as e:
+            print(f"[Reranker] Redis cache write failed: {e}")
+
+    def _record(self, elapsed_ms: float):
+        with self._lock:
+            self.calls += 1
+            self.total_ms += elapsed_ms
+            self.last_ms = elapsed_ms
+            if elapsed_ms <= self.budget_ms:
+                self._strikes = 0
+                return
+            self.over_budget += 1
+            self._strikes += 1
+            if self._strikes >= self.max_over_budget:
+                self._strikes = 0
+                self._disabled_until = time.monotonic() + self.cooldown_seconds
+                self.auto_disabled += 1
+                print(f"[Reranker] {self.max_over_budget} turns over the {self.budget_ms:.0f}ms budget "
+                      f"(last {elapsed_ms:.0f}ms); disabled for {self.cooldown_seconds:.0f}s")
+
+    def rerank(self, query: str, candidates: list, top_n: int):
+        """Return (top_n candidates by cross-encoder score, stats).
+
+        Each returned candidate gets a `rerank_score`. Candidates come back
+        unchanged (truncated to top_n) when the stage is inactive or fails.
+        """
+        if not self.active() or not candidates:
+            return candidates[:top_n], {"applied": False}
+
+        start = time.perf_counter()
+        try:
+            key = self._cache_key(query)
+            ids = [candidate_id(c) for c in candidates]
+            scores = self._cached_scores(key, ids)
+            missing = [i for i, s in enumerate(scores) if s is None]
+            if missing:
+                fresh = get_rerank_model().predict(
+                    [(query, candidate_text(candidates[i])) for i in missing],
+                    batch_size=len(missing),
+                    show_progress_bar=False,
+                )
+                for i, score in zip(missing, fresh):
+                    scores[i] = float(score)
+                self._store_scores(key, {ids[i]: scores[i] for i in missing})
+        except Exception as e:
+            print(f"[Reranker] Rerank failed, keeping retrieval order: {e}")
+            return candidates[:top_n], {"applied": False, "error": str(e)}
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._record(elapsed_ms)
+        self.pairs_scored += len(missing)
+        self.cache_hits += len(candidates) - len(missing)
+
+        for c, score in zip(candidates, scores):
+            c["rerank_score"] = score
+        ranked = sorted(candidates, key=lambda c: c["rerank_score"], reverse=True)[:top_n]
+        return ranked, {
+            "applied": True,
+            "ms": round(elapsed_ms, 1),
+            "candidates": len(candidates),
+            "scored": len(missing),
+            "cached": len(candidates) - len(missing),
+            "over_budget": elapsed_ms > self.budget_ms,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "active": self.active(),
+            "calls": self.calls,
+            "pairs_scored": self.pairs_scored,
+            "cache_hits": self.cache_hits,
+            "avg_ms": round(self.total_ms / self.calls, 1) if self.calls else 0.0,
+            "last_ms": round(self.last_ms, 1) if self.last_ms is not None else None,
+            "budget_ms": self.budget_ms,
+            "over_budget": self.over_budget,
+            "auto_disabled": self.auto_disabled,
+        }
+
+
+reranker = Reranker()
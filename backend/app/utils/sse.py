@@ -1,5 +1,112 @@
 import json
+import re
+from app.config import get_async_redis, SSE_HEARTBEAT_SECONDS
+
+# SSE comment line; ignored by EventSource but keeps proxies from closing idle streams
+HEARTBEAT = ": heartbeat\n\n"
+# Redis Stream entry id, e.g. "1718000000000-0"
+STREAM_ID_RE = re.compile(r"^\d+-\d+$")
+
 
 def format_sse(event_type: str, data: dict) -> str:
     """Return an SSE-formatted string for given event type and data."""
     return f"event: {event_type}\n" + "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+
+
+async def pubsub_event_stream(conversation_id: str):
+    """Async generator yielding SSE frames for events published on the conversation channel.
+
+    Waits on the socket instead of polling, so an idle stream costs one coroutine
+    and one Redis connection rather than a threadpool thread. A heartbeat comment
+    is emitted whenever no event arrives within SSE_HEARTBEAT_SECONDS.
+    """
+    pubsub = get_async_redis().pubsub()
+    channel = f"conversation:{conversation_id}"
+    # Mark subscriber flag so orchestrator can detect a connected client
+    sub_flag_key = f"conversation:{conversation_id}:subscribed"
+
+    try:
+        await pubsub.subscribe(channel)
+        try:
+            await get_async_redis().set(sub_flag_key, "1", ex=30)
+        except Exception:
+            pass
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_HEARTBEAT_SECONDS)
+            if not message:
+                yield HEARTBEAT
+                continue
+            if message.get("type") != "message":
+                continue
+
+            raw = message.get("data")
+            if isinstance(raw, bytes):
+                raw = raw.decode("utf-8")
+            # Each published payload should be a JSON string
+            try:
+                payload = json.loads(raw)
+            except Exception:
+                payload = {"type": "unknown", "data": raw}
+
+            event_type = payload.get("type", "message")
+            yield format_sse(event_type, payload.get("data", {}))
+
+            # Stop streaming if done event is received
+            if event_type == "done":
+                break
+    finally:
+        # Runs on normal completion and when the client disconnects (generator is cancelled)
+        try:
+            await get_async_redis().delete(sub_flag_key)
+        except Exception:
+            pass
+        try:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+
+def format_sse_raw(event_type: str, data_json: str, event_id: str | None = None) -> str:
+    """Return an SSE frame for a payload that is already JSON-encoded."""
+    s = f"id: {event_id}\n" if event_id else ""
+    return s + f"event: {event_type}\n" + "data: " + data_json + "\n\n"
+
+
+async def redis_stream_events(conversation_id: str, last_event_id: str | None = None):
+    """Async generator yielding SSE frames from the conversation's Redis Stream.
+
+    Every frame carries the stream entry id as its SSE `id`, so a reconnecting
+    EventSource sends it back as `Last-Event-ID` and resumes right after it.
+    Without one, reading starts at the cursor recorded when the current turn
+    began (so events published before the client connected are replayed), or
+    at the tail of the stream when no turn is in flight.
+    """
+    key = f"conversation:{conversation_id}:events"
+
+    cursor = last_event_id if last_event_id and STREAM_ID_RE.match(last_event_id) else None
+    if cursor is None:
+        cursor = await get_async_redis().get(f"conversation:{conversation_id}:turn")
+    if cursor is None:
+        # Resolve "$" to a concrete id up front; re-issuing XREAD with "$" would
+        # drop anything added between two blocking calls.
+        latest = await get_async_redis().xrevrange(key, count=1)
+        cursor = latest[0][0] if latest else "0-0"
+
+    block_ms = int(SSE_HEARTBEAT_SECONDS * 1000)
+    while True:
+        resp = await get_async_redis().xread({key: cursor}, count=100, block=block_ms)
+        if not resp:
+            yield HEARTBEAT
+            continue
+
+        for _stream, entries in resp:
+            for entry_id, fields in entries:
+                cursor = entry_id
+                event_type = fields.get("type", "message")
+                yield format_sse_raw(event_type, fields.get("data", "{}"), entry_id)
+
+                # Stop streaming if done event is received
+                if event_type == "done":
+                    return
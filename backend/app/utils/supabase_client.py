@@ -1,11 +1,15 @@
 # app/utils/supabase_client.py
-from supabase import create_client
 import os
 from dotenv import load_dotenv
+from app.config import lazy_singleton
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+@lazy_singleton
+def get_supabase():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
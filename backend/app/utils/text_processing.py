@@ -1,7 +1,22 @@
 import requests
+import hashlib
 from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
 import pdfplumber
-from typing import List, Dict
+import collections
+import itertools
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Iterator
+from app.config import PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, HTML_EXTRACTOR
+from app.utils.pdf_extract import count_pages, extract_page_range, extract_page_text
+
+# Shared extraction pool, created on first parallel extraction in this process
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
 
 def fetch_url(url, timeout=10):
     """Fetch raw HTML from a URL."""
@@ -10,18 +25,89 @@ def fetch_url(url, timeout=10):
     resp.raise_for_status()
     return resp.text
 
-def extract_main_text(html):
-    """Extract main textual content from HTML."""
+
+def fetch_url_conditional(url, etag=None, last_modified=None, timeout=10):
+    """Conditional GET using stored validators.
+
+    Returns (status_code, html, validators). `html` is None on 304 Not
+    Modified; `validators` holds the response's `etag` and `last_modified`
+    (falling back to the ones sent when the server omits them).
+    """
+    headers = {"User-Agent": "Mozilla/5.0"}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    resp = requests.get(url, headers=headers, timeout=timeout)
+    validators = {
+        "etag": resp.headers.get("ETag") or etag,
+        "last_modified": resp.headers.get("Last-Modified") or last_modified,
+    }
+    if resp.status_code == 304:
+        return 304, None, validators
+    resp.raise_for_status()
+    return resp.status_code, resp.text, validators
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of extracted text, used to detect changed pages and chunks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# Tags whose content is never part of the main text
+BOILERPLATE_TAGS = ["script", "style", "header", "footer", "nav"]
+
+
+def _extract_main_text_bs4(html):
     soup = BeautifulSoup(html, "html.parser")
 
     # Remove scripts, styles, and irrelevant tags
-    for tag in soup(["script", "style", "header", "footer", "nav"]):
+    for tag in soup(BOILERPLATE_TAGS):
         tag.decompose()
 
-    text = soup.get_text(separator="\n")
+    return soup.get_text(separator="\n")
+
+
+def _extract_main_text_lxml(html):
+    if not html or not html.strip():
+        return ""
+    try:
+        doc = lxml_html.document_fromstring(html)
+    except ValueError:
+        # lxml rejects str input that carries an XML encoding declaration
+        doc = lxml_html.document_fromstring(html.encode("utf-8"))
+
+    # Same tags as the bs4 path; comments and PIs are dropped too, since
+    # BeautifulSoup's get_text() skips them. A removed node's tail is merged
+    # into the preceding text, so start it on its own line, as bs4's separator does
+    removed = (etree.Comment, etree.ProcessingInstruction, *BOILERPLATE_TAGS)
+    for node in doc.iter(*removed):
+        if node.tail:
+            node.tail = "\n" + node.tail
+    etree.strip_elements(doc, *removed, with_tail=False)
+    return "\n".join(doc.itertext())
+
+
+def extract_main_text(html, engine=None):
+    """Extract main textual content from HTML.
+
+    `engine` is "lxml" (default, via HTML_EXTRACTOR) or "bs4". Both drop the
+    same boilerplate tags and normalise to one stripped, non-empty line per
+    text node; lxml falls back to bs4 if it can't parse the document.
+    """
+    engine = engine or HTML_EXTRACTOR
+    text = None
+    if engine == "lxml":
+        try:
+            text = _extract_main_text_lxml(html)
+        except Exception as e:
+            print(f"[TextProcessing] lxml extraction failed, falling back to bs4: {e}")
+    if text is None:
+        text = _extract_main_text_bs4(html)
+
     lines = [line.strip() for line in text.splitlines() if line.strip()]
     return "\n".join(lines)
 
+
 def chunk_text(text, chunk_size=400, overlap=50):
     """Split text into chunks with some overlap (token-based or approx by words)."""
     words = text.split()
@@ -35,17 +121,114 @@ def chunk_text(text, chunk_size=400, overlap=50):
     return chunks
 
 
-def extract_text_from_pdf(file_path: str) -> List[str]:
-    """Return a list of page texts for the given PDF file path."""
-    pages = []
+def _get_pdf_pool(workers: int) -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_pool
+
+
+def _iter_pdf_pages_serial(file_path: str) -> Iterator[str]:
     with pdfplumber.open(file_path) as pdf:
         for page in pdf.pages:
+            yield extract_page_text(page)
+
+
+def _reset_pdf_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool (e.g. a child died on a bad PDF); the next parallel extraction starts a new one."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_range_serial(file_path: str, start: int, end: int) -> List[str]:
+    try:
+        return extract_page_range(file_path, start, end)
+    except Exception as e:
+        print(f"[PDF] Extraction of pages {start + 1}-{end} failed: {e}")
+        return [""] * (end - start)
+
+
+def _iter_pdf_pages_parallel(file_path: str, page_count: int, workers: int) -> Iterator[str]:
+    # Several ranges per worker so early pages come back quickly for the
+    # downstream stages and uneven pages balance out
+    range_size = max(4, math.ceil(page_count / (workers * 4)))
+    ranges = [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+    pool = _get_pdf_pool(workers)
+    broken = False
+    # Keep only `workers` ranges in flight, so extracted text can't pile up
+    # ahead of the bounded queues of a slower consumer
+    pending = iter(ranges)
+    in_flight = collections.deque()
+
+    def mark_broken():
+        nonlocal broken
+        if not broken:
+            broken = True
+            print("[PDF] Extraction pool broke; extracting the remaining pages serially")
+            _reset_pdf_pool(pool)
+
+    def submit(start, end):
+        # A None future means the range is extracted serially when its turn comes
+        fut = None
+        if not broken:
             try:
-                txt = page.extract_text() or ""
-            except Exception:
-                txt = ""
-            pages.append(txt)
-    return pages
+                fut = pool.submit(extract_page_range, file_path, start, end)
+            except BrokenProcessPool:
+                mark_broken()
+        in_flight.append((start, end, fut))
+
+    try:
+        for start, end in itertools.islice(pending, workers):
+            submit(start, end)
+        while in_flight:
+            start, end, fut = in_flight.popleft()
+            texts = None
+            if fut is not None:
+                try:
+                    texts = fut.result()
+                except BrokenProcessPool:
+                    mark_broken()
+                except Exception as e:
+                    print(f"[PDF] Extraction of pages {start + 1}-{end} failed: {e}")
+                    texts = [""] * (end - start)
+            if texts is None:
+                texts = _extract_range_serial(file_path, start, end)
+            for next_start, next_end in itertools.islice(pending, 1):
+                submit(next_start, next_end)
+            yield from texts
+    finally:
+        # Consumer stopped early (e.g. the pipeline aborted): drop queued ranges
+        for _, _, fut in in_flight:
+            if fut is not None:
+                fut.cancel()
+
+
+def iter_pdf_pages(file_path: str, workers: int = PDF_EXTRACT_WORKERS, min_pages: int = PDF_PARALLEL_MIN_PAGES) -> Iterator[str]:
+    """Yield page texts in order, one at a time.
+
+    Files with at least `min_pages` pages are split into page ranges that are
+    extracted concurrently by a process pool of `workers` processes, each
+    opening the file independently. Smaller files (or workers <= 1) use the
+    serial path. Pages that fail to extract yield an empty string either way.
+    """
+    if workers > 1:
+        try:
+            page_count = count_pages(file_path)
+        except Exception:
+            page_count = 0
+        if page_count >= min_pages:
+            yield from _iter_pdf_pages_parallel(file_path, page_count, workers)
+            return
+    yield from _iter_pdf_pages_serial(file_path)
+
+
+def extract_text_from_pdf(file_path: str) -> List[str]:
+    """Return a list of page texts for the given PDF file path."""
+    return list(iter_pdf_pages(file_path))
 
 
 def chunk_page_text_with_offsets(page_text: str, chunk_size_chars: int = 2000, overlap_chars: int = 200) -> List[Dict]:
@@ -1,18 +1,173 @@
-from qdrant_client.models import PointStruct
-from app.config import qdrant_client
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from app.config import (
+    lazy_singleton,
+    HYBRID_SEARCH_ENABLED,
+    VECTOR_STORE_BACKEND,
+    LOCAL_INDEX_DIR,
+    LOCAL_INDEX_DTYPE,
+    QDRANT_UPSERT_BATCH_SIZE,
+    QDRANT_UPSERT_PARALLELISM,
+    QDRANT_UPSERT_WAIT,
+    QDRANT_BARRIER_TIMEOUT_SECONDS,
+)
 
-def init_collection(name, vector_size):
-    """Create collection if not exists."""
-    try:
-        qdrant_client.recreate_collection(
-            collection_name=name,
-            vectors_config={"size": vector_size, "distance": "Cosine"},
-        )
-    except Exception as e:
-        print("Exception in creating collection: ",e)
+
+class VectorStore(ABC):
+    """Interface implemented by the vector store backends.
+
+    Hits returned by `search`/`search_sparse` expose `.id`, `.score`,
+    `.payload` and `.vector` (None unless requested), like Qdrant's ScoredPoint.
+    Distance is cosine throughout. Abstract methods are required, so a backend
+    missing one fails when it is constructed; the others have working defaults.
+    """
+
+    supports_sparse = False  # whether `search_sparse` (the lexical leg of hybrid search) is available
+
+    @abstractmethod
+    def init_collection(self, name, vector_size):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self, collection_name, vectors, payloads, ids, wait=True):
+        raise NotImplementedError
+
+    def upsert_sparse(self, collection_name, payloads, ids, wait=True):
         pass
 
+    @abstractmethod
+    def search(self, collection_name, vector, limit, doc_ids=None, with_vectors=False):
+        raise NotImplementedError
+
+    def search_batch(self, collection_name, vectors, limit, doc_ids=None):
+        """One hit list per query vector; backends override this with a single batched request."""
+        return [self.search(collection_name, v, limit, doc_ids=doc_ids) for v in vectors]
+
+    def search_sparse(self, collection_name, text, limit, doc_ids=None):
+        return []
+
+    @abstractmethod
+    def count(self, collection_name, doc_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_document(self, collection_name, doc_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def scroll_document(self, collection_name, doc_id, payload_fields):
+        """Return [(point_id, payload)] for every point of `doc_id`, payloads limited to `payload_fields`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_ids(self, collection_name, ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def healthy(self):
+        """True if the store is usable; may raise instead of returning False."""
+        raise NotImplementedError
+
+
+@lazy_singleton
+def get_vector_store() -> VectorStore:
+    """The configured backend (VECTOR_STORE_BACKEND), built on first use."""
+    if VECTOR_STORE_BACKEND == "local":
+        from app.utils.local_store import LocalVectorStore
+        return LocalVectorStore(LOCAL_INDEX_DIR, dtype=LOCAL_INDEX_DTYPE)
+    # Imported here so processes that never touch the store don't import qdrant_client
+    from app.utils.qdrant_store import QdrantVectorStore
+    return QdrantVectorStore()
+
+
+def hybrid_available():
+    return HYBRID_SEARCH_ENABLED and get_vector_store().supports_sparse
+
+
+# Shared pool for in-flight upsert requests
+_upsert_pool = ThreadPoolExecutor(max_workers=QDRANT_UPSERT_PARALLELISM, thread_name_prefix="qdrant-upsert")
+
+
+def init_collection(name, vector_size):
+    """Create the collection if it doesn't exist; never wipes an existing one."""
+    get_vector_store().init_collection(name, vector_size)
+
 def upsert_vectors(collection_name, vectors, payloads, ids):
-    """Upsert embeddings with payloads into Qdrant."""
-    points = [PointStruct(id=i, vector=v, payload=p) for i, v, p in zip(ids, vectors, payloads)]
-    qdrant_client.upsert(collection_name=collection_name, points=points)
+    """Upsert embeddings with payloads into the vector store."""
+    get_vector_store().upsert(collection_name, vectors, payloads, ids)
+
+def submit_upserts(collection_name, vectors, payloads, ids, batch_size=QDRANT_UPSERT_BATCH_SIZE, wait=QDRANT_UPSERT_WAIT):
+    """Split points into batches and send them concurrently; returns one Future per batch.
+
+    With hybrid search enabled, each chunk is also written to the sparse
+    collection (same id and payload), as separate batches in the same list.
+    With wait=False each request returns as soon as Qdrant has accepted the
+    operation, before it is indexed; use `wait_for_document_points` as the
+    consistency barrier before relying on the data.
+    """
+    store = get_vector_store()
+    futures = [
+        _upsert_pool.submit(store.upsert, collection_name, vectors[i:i + batch_size], payloads[i:i + batch_size], ids[i:i + batch_size], wait=wait)
+        for i in range(0, len(ids), batch_size)
+    ]
+    if hybrid_available():
+        futures.extend(
+            _upsert_pool.submit(store.upsert_sparse, collection_name, payloads[i:i + batch_size], ids[i:i + batch_size], wait=wait)
+            for i in range(0, len(ids), batch_size)
+        )
+    return futures
+
+def upsert_vectors_bulk(collection_name, vectors, payloads, ids, batch_size=QDRANT_UPSERT_BATCH_SIZE, wait=QDRANT_UPSERT_WAIT):
+    """Upsert in parallel batches and block until every batch is acknowledged."""
+    for fut in submit_upserts(collection_name, vectors, payloads, ids, batch_size=batch_size, wait=wait):
+        fut.result()
+
+def search_vectors(collection_name, vector, limit, doc_ids=None, with_vectors=False):
+    """Top `limit` hits by cosine similarity, optionally restricted to `doc_ids` (None/empty = all)."""
+    return get_vector_store().search(collection_name, vector, limit, doc_ids=doc_ids or None, with_vectors=with_vectors)
+
+def search_vectors_batch(collection_name, vectors, limit, doc_ids=None):
+    """`search_vectors` for many query vectors in one request; returns one hit list per vector."""
+    if not len(vectors):
+        return []
+    return get_vector_store().search_batch(collection_name, vectors, limit, doc_ids=doc_ids or None)
+
+def search_lexical(collection_name, text, limit, doc_ids=None):
+    """BM25 hits for `text`; [] if the backend has no sparse index or the text has no usable terms."""
+    return get_vector_store().search_sparse(collection_name, text, limit, doc_ids=doc_ids or None)
+
+def count_document_points(collection_name, doc_id):
+    return get_vector_store().count(collection_name, doc_id)
+
+def wait_for_document_points(collection_name, doc_id, expected, timeout=QDRANT_BARRIER_TIMEOUT_SECONDS, exact=False):
+    """Consistency barrier: block until `expected` points for `doc_id` are visible.
+
+    Needed after fire-and-confirm (wait=False) upserts, whose acknowledgement
+    precedes indexing. With `exact`, the count must equal `expected`, so
+    deletes made before the barrier are visible too. Raises TimeoutError if
+    the count isn't reached in time.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while True:
+        found = count_document_points(collection_name, doc_id)
+        if found == expected or (found > expected and not exact):
+            return found
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Only {found}/{expected} points visible for doc {doc_id} after {timeout}s")
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+def delete_document_vectors(collection_name, doc_id):
+    """Delete every point whose payload belongs to `doc_id` (from the sparse collection too)."""
+    get_vector_store().delete_document(collection_name, doc_id)
+
+def scroll_document_points(collection_name, doc_id, payload_fields):
+    """Return [(point_id, payload)] for every point of `doc_id` (vectors not loaded)."""
+    return get_vector_store().scroll_document(collection_name, doc_id, payload_fields)
+
+def delete_points(collection_name, ids):
+    """Delete points by id; returns once the delete is applied."""
+    if ids:
+        get_vector_store().delete_ids(collection_name, list(ids))
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+import httpx
+from app.config import (
+    CRAWL_MAX_CONCURRENCY,
+    CRAWL_PER_HOST_CONCURRENCY,
+    CRAWL_TIMEOUT_SECONDS,
+    CRAWL_MAX_BYTES,
+)
+
+USER_AGENT = "Mozilla/5.0"
+
+
+@dataclass
+class CrawlResult:
+    url: str
+    status_code: int | None = None
+    html: str | None = None
+    validators: dict = field(default_factory=dict)
+    error: str | None = None
+    elapsed: float = 0.0
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+async def _read_capped(resp: httpx.Response, max_bytes: int) -> bytes:
+    declared = resp.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise ResponseTooLarge(f"Content-Length {declared} exceeds {max_bytes} bytes")
+    body = bytearray()
+    async for chunk in resp.aiter_bytes():
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise ResponseTooLarge(f"Response exceeds {max_bytes} bytes")
+    return bytes(body)
+
+
+async def fetch_all(urls, max_concurrency: int = CRAWL_MAX_CONCURRENCY, per_host: int = CRAWL_PER_HOST_CONCURRENCY,
+                    timeout: float = CRAWL_TIMEOUT_SECONDS, max_bytes: int = CRAWL_MAX_BYTES):
+    """Fetch many URLs concurrently over one pooled keep-alive client.
+
+    Concurrency is bounded both globally and per host. Each response body is
+    streamed and abandoned once it exceeds `max_bytes`. Failures are reported
+    on the result (`error`) rather than raised, so one bad URL doesn't sink
+    the batch. Results are returned in the order of `urls`.
+    """
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    global_sem = asyncio.Semaphore(max_concurrency)
+    host_sems = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    async with httpx.AsyncClient(
+        limits=limits,
+        timeout=httpx.Timeout(timeout),
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+    ) as client:
+
+        async def fetch_one(url: str) -> CrawlResult:
+            result = CrawlResult(url=url)
+            started = time.monotonic()
+            try:
+                async with host_sems[urlparse(url).netloc], global_sem:
+                    async with client.stream("GET", url) as resp:
+                        result.status_code = resp.status_code
+                        resp.raise_for_status()
+                        body = await _read_capped(resp, max_bytes)
+                        result.html = body.decode(resp.encoding or "utf-8", errors="replace")
+                        result.validators = {
+                            "etag": resp.headers.get("ETag"),
+                            "last_modified": resp.headers.get("Last-Modified"),
+                        }
+            except Exception as e:
+                result.error = f"{type(e).__name__}: {e}"
+            result.elapsed = time.monotonic() - started
+            return result
+
+        return await asyncio.gather(*(fetch_one(u) for u in urls))
+
+
+def crawl(urls, **kwargs):
+    """Synchronous entry point for `fetch_all` (used by the ingestion worker)."""
+    return asyncio.run(fetch_all(list(urls), **kwargs))
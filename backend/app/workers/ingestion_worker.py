@@ -1,22 +1,38 @@
 import time
 import json
+import os
 import uuid
-from app.config import redis_client
-from app.utils.supabase_client import supabase
-from app.utils.text_processing import fetch_url, extract_main_text, chunk_text
-from app.utils.text_processing import extract_text_from_pdf, chunk_page_text_with_offsets
-from app.utils.embeddings import embed_texts
-from app.utils.vectorstore import upsert_vectors, init_collection
-
-QUEUE_KEY = "ingest:jobs"
+import multiprocessing
+from app.config import INGEST_WORKERS, CRAWL_BATCH_SIZE
+from app.utils.supabase_client import get_supabase
+from app.utils.text_processing import fetch_url_conditional, extract_main_text, chunk_text, content_hash
+from app.utils.embeddings import embed_texts_cached, warmup, EMBEDDING_DIMENSION
+from app.utils.vectorstore import (
+    upsert_vectors_bulk, init_collection, delete_document_vectors, wait_for_document_points,
+    scroll_document_points, delete_points,
+)
+from app.workers.pdf_pipeline import ingest_pdf_pipelined
+from app.utils.answer_cache import bump_doc_version
+from app.workers.job_queue import (
+    claim_job, claim_more_jobs, ack_job, fail_job, is_final_attempt, record_duration, run_maintenance, ClaimHeartbeat,
+)
+from app.workers.crawler import crawl
+
 COLLECTION_NAME = "documents_chunks"
-VECTOR_SIZE = 384  # depends on sentence-transformers model (all-MiniLM-L6-v2)
+VECTOR_SIZE = EMBEDDING_DIMENSION  # 384 for all-MiniLM-L6-v2, on either embedding backend
+MAINTENANCE_INTERVAL_SECONDS = 5  # also the blocking-pop timeout, so idle workers still run maintenance
+WORKER_FAST_EXIT_SECONDS = 30  # a worker that dies sooner than this after starting counts as a failed start
+WORKER_RESTART_MAX_SECONDS = 60  # cap on the restart backoff after repeated failed starts
 
-# Initialize Qdrant collection
-init_collection(COLLECTION_NAME, VECTOR_SIZE)
 
+def process_job(job_payload, final_attempt: bool = True, prefetched=None):
+    """Ingest one job. Raises on failure so the queue can retry it.
 
-def process_job(job_payload):
+    The document is marked 'failed' only on the final attempt; earlier
+    failures leave it 'queued' for the retry. `prefetched` is the job's
+    CrawlResult when its URL was already fetched by the batch crawler.
+    Returns per-job stats, or None when the job was skipped.
+    """
     job = json.loads(job_payload)
     job_id = job["job_id"]
     doc_id = job["doc_id"]
@@ -24,86 +40,271 @@ def process_job(job_payload):
 
     print(f"[Worker] Processing job {job_id} for doc_id: {doc_id} url: {url}")
 
+    if job.get("refresh"):
+        # The document stays 'completed' (and searchable) while it is refreshed;
+        # failures are left to the queue's retry handling
+        return refresh_url_document(job_id, doc_id, url)
+
     try:
         # Atomic update: set job status to 'processing'
-        current = supabase.table("documents").select("status").eq("doc_id", doc_id).execute()
-        if not current.data or current.data[0]["status"] in ["processing", "completed"]:
+        current = get_supabase().table("documents").select("status").eq("doc_id", doc_id).execute()
+        # A retried or re-queued job may find its own earlier 'processing' status
+        skip_statuses = ["completed"] if job.get("attempts") else ["processing", "completed"]
+        if not current.data or current.data[0]["status"] in skip_statuses:
             print(f"[Worker] Job {job_id} skipped: document already {current.data[0]['status'] if current.data else 'not found'}")
-            return
+            return None
         
-        supabase.table("documents").update({"status": "processing"}).eq("doc_id", doc_id).execute()
+        get_supabase().table("documents").update({"status": "processing"}).eq("doc_id", doc_id).execute()
+
+        if job.get("attempts"):
+            # An earlier attempt may have died after upserting some points; start clean
+            # so they aren't duplicated (and don't satisfy the barrier below early)
+            delete_document_vectors(COLLECTION_NAME, doc_id)
 
         if "file_path" in job:
-            # PDF upload ingestion: extract pages and chunk within page boundaries
+            # PDF upload ingestion: extract pages and chunk within page boundaries,
+            # embedding cross-page batches and upserting them as they are ready
             file_path = job["file_path"]
-            pages = extract_text_from_pdf(file_path)
-            all_chunks = []
-            vector_ids = []
-            payloads = []
-
-            for page_idx, page_text in enumerate(pages, start=1):
-                page_chunks = chunk_page_text_with_offsets(page_text)
-                texts = [c["text"] for c in page_chunks]
-                if not texts:
-                    continue
-                embeddings = embed_texts(texts)
-                for emb, c in zip(embeddings, page_chunks):
-                    vid = str(uuid.uuid4())
-                    vector_ids.append(vid)
-                    payloads.append({
-                        "chunk_id": vid,
-                        "doc_id": doc_id,
-                        "page_number": page_idx,
-                        "text": c.get("text"),
-                        "start_offset": c.get("start_offset"),
-                        "end_offset": c.get("end_offset")
-                    })
-                    all_chunks.append(emb)
-
-            if all_chunks:
-                upsert_vectors(COLLECTION_NAME, all_chunks, payloads, vector_ids)
-            else:
+            try:
+                stats = ingest_pdf_pipelined(file_path, doc_id, COLLECTION_NAME)
+            except Exception:
+                # Don't leave a partially indexed document behind
+                try:
+                    delete_document_vectors(COLLECTION_NAME, doc_id)
+                except Exception as cleanup_err:
+                    print(f"[Worker] Job {job_id}: failed to remove partial vectors: {cleanup_err}")
+                raise
+
+            if not stats["chunks"]:
                 raise ValueError("No chunks extracted from PDF")
+            print(f"[Worker] Job {job_id}: {stats['pages']} pages, {stats['chunks']} chunks in {stats['batches']} batches")
+            job_stats = {"chunks": stats["chunks"], "cache_hits": stats["cache_hits"]}
 
         else:
-            # Fetch & extract text from URL
-            html = fetch_url(url)
+            # Fetch & extract text from URL, keeping validators for later conditional refreshes
+            if prefetched is not None:
+                if prefetched.error:
+                    raise RuntimeError(f"Fetch failed: {prefetched.error}")
+                html, validators = prefetched.html, prefetched.validators
+            else:
+                _, html, validators = fetch_url_conditional(url)
             text = extract_main_text(html)
+            url_metadata = {**validators, "content_hash": content_hash(text)}
 
             # Chunk text
             chunks = chunk_text(text)
             if not chunks:
                 raise ValueError("No chunks extracted from URL")
 
-            # Generate embeddings
-            embeddings = embed_texts(chunks)
+            # Generate embeddings (unchanged chunks come from the embedding cache)
+            embeddings, cache_hits = embed_texts_cached(chunks)
+            job_stats = {"chunks": len(chunks), "cache_hits": cache_hits}
 
             # Upsert into Qdrant
             vector_ids = [str(uuid.uuid4()) for _ in chunks]
             payloads = [
-                {"chunk_id": vid, "doc_id": doc_id, "url": url, "text_snippet": chunk}
+                {"chunk_id": vid, "doc_id": doc_id, "url": url, "text_snippet": chunk, "chunk_hash": content_hash(chunk)}
                 for vid, chunk in zip(vector_ids, chunks)
             ]
-            upsert_vectors(COLLECTION_NAME, embeddings, payloads, vector_ids)
+            upsert_vectors_bulk(COLLECTION_NAME, embeddings, payloads, vector_ids)
+
+        # Consistency barrier: all points must be visible before the document is searchable
+        wait_for_document_points(COLLECTION_NAME, doc_id, job_stats["chunks"])
 
         # Update Supabase tables
-        supabase.table("documents").update({"status": "completed"}).eq("doc_id", doc_id).execute()
+        update = {"status": "completed"}
+        if "file_path" not in job:
+            update.update(url_metadata)
+        get_supabase().table("documents").update(update).eq("doc_id", doc_id).execute()
+        # Invalidate cached answers that cite this document
+        bump_doc_version(doc_id)
 
-        print(f"[Worker] Job {job_id} completed successfully")
+        job_stats["cache_hit_rate"] = round(job_stats["cache_hits"] / job_stats["chunks"], 4) if job_stats["chunks"] else 0.0
+        print(f"[Worker] Job {job_id} completed successfully (embedding cache hit rate {job_stats['cache_hit_rate']:.0%})")
+        return job_stats
 
     except Exception as e:
         print(f"[Worker] Job {job_id} failed: {e}")
-        supabase.table("documents").update({"status": "failed"}).eq("doc_id", doc_id).execute()
+        status = "failed" if final_attempt else "queued"
+        get_supabase().table("documents").update({"status": status}).eq("doc_id", doc_id).execute()
+        raise
+
+
+def refresh_url_document(job_id, doc_id, url):
+    """Re-crawl an ingested URL, touching only the chunks that changed.
+
+    Sends a conditional GET with the stored ETag/Last-Modified and compares
+    the extracted text's hash with the stored one. When the page did change,
+    chunks are diffed by `chunk_hash`: new chunks are embedded and upserted,
+    chunks that disappeared are deleted, unchanged ones are left in place.
+    """
+    res = get_supabase().table("documents").select("etag", "last_modified", "content_hash").eq("doc_id", doc_id).execute()
+    doc = res.data[0] if res.data else {}
+
+    status_code, html, validators = fetch_url_conditional(url, doc.get("etag"), doc.get("last_modified"))
+    if status_code == 304:
+        print(f"[Worker] Job {job_id}: {url} not modified (304)")
+        return {"chunks": 0, "cache_hits": 0, "unchanged": True}
+
+    text = extract_main_text(html)
+    text_hash = content_hash(text)
+    if text_hash == doc.get("content_hash"):
+        get_supabase().table("documents").update(validators).eq("doc_id", doc_id).execute()
+        print(f"[Worker] Job {job_id}: {url} content unchanged")
+        return {"chunks": 0, "cache_hits": 0, "unchanged": True}
+
+    chunks = chunk_text(text)
+    if not chunks:
+        raise ValueError("No chunks extracted from URL")
+    new_chunks = {}
+    for chunk in chunks:
+        new_chunks.setdefault(content_hash(chunk), chunk)
+
+    # Keep one existing point per still-present chunk; everything else is stale
+    kept = {}
+    stale_ids = []
+    for point_id, payload in scroll_document_points(COLLECTION_NAME, doc_id, ["chunk_hash"]):
+        h = payload.get("chunk_hash")
+        if h in new_chunks and h not in kept:
+            kept[h] = point_id
+        else:
+            stale_ids.append(point_id)
+
+    added = [(h, c) for h, c in new_chunks.items() if h not in kept]
+    cache_hits = 0
+    if added:
+        embeddings, cache_hits = embed_texts_cached([c for _, c in added])
+        vector_ids = [str(uuid.uuid4()) for _ in added]
+        payloads = [
+            {"chunk_id": vid, "doc_id": doc_id, "url": url, "text_snippet": c, "chunk_hash": h}
+            for vid, (h, c) in zip(vector_ids, added)
+        ]
+        upsert_vectors_bulk(COLLECTION_NAME, embeddings, payloads, vector_ids)
+    # Delete after upserting so the document never disappears from search mid-refresh.
+    # The barrier waits for the exact count, so it can't pass before the deletes are visible
+    delete_points(COLLECTION_NAME, stale_ids)
+    wait_for_document_points(COLLECTION_NAME, doc_id, len(new_chunks), exact=True)
+
+    get_supabase().table("documents").update({**validators, "content_hash": text_hash}).eq("doc_id", doc_id).execute()
+    bump_doc_version(doc_id)
+
+    print(f"[Worker] Job {job_id}: refreshed {url}: {len(added)} added, {len(stale_ids)} removed, {len(kept)} unchanged")
+    return {
+        "chunks": len(added),
+        "cache_hits": cache_hits,
+        "cache_hit_rate": round(cache_hits / len(added), 4) if added else 0.0,
+        "kept": len(kept),
+        "removed": len(stale_ids),
+    }
+
 
 def worker_loop():
-    print("[Worker] Started ingestion worker...")
+    print(f"[Worker {os.getpid()}] Started ingestion worker...")
+    # Load the model before claiming anything so the first job isn't slowed by it
+    warmup()
+    last_maintenance = 0.0
     while True:
-        job_payload = redis_client.lpop(QUEUE_KEY)
-        if job_payload:
-            process_job(job_payload)
-        else:
-            time.sleep(2)  # no job, wait
+        if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL_SECONDS:
+            try:
+                run_maintenance()
+            except Exception as e:
+                print(f"[Worker {os.getpid()}] Queue maintenance failed: {e}")
+            last_maintenance = time.monotonic()
+
+        job_payload = claim_job(timeout=MAINTENANCE_INTERVAL_SECONDS)
+        if not job_payload:
+            continue
+
+        # URL jobs are claimed in batches so their pages can be fetched concurrently
+        payloads = [job_payload]
+        if is_crawlable(job_payload):
+            payloads += claim_more_jobs(CRAWL_BATCH_SIZE - 1)
+
+        with ClaimHeartbeat(*payloads) as heartbeat:
+            prefetched = prefetch_urls(payloads)
+            for payload in payloads:
+                run_claimed_job(payload, prefetched.get(payload), heartbeat)
+
+
+def is_crawlable(job_payload) -> bool:
+    """Plain URL ingestion jobs; refreshes do their own conditional GET."""
+    job = json.loads(job_payload)
+    return bool(job.get("url")) and "file_path" not in job and not job.get("refresh")
+
+
+def prefetch_urls(payloads) -> dict:
+    """Fetch the pages of all crawlable jobs concurrently; returns {payload: CrawlResult}."""
+    crawlable = [p for p in payloads if is_crawlable(p)]
+    if len(crawlable) < 2:
+        return {}
+    started = time.monotonic()
+    try:
+        results = crawl(json.loads(p)["url"] for p in crawlable)
+    except Exception as e:
+        # Jobs fall back to fetching their own page
+        print(f"[Worker {os.getpid()}] Batch crawl failed: {e}")
+        return {}
+    elapsed = time.monotonic() - started
+    ok = sum(1 for r in results if not r.error)
+    print(f"[Worker {os.getpid()}] Crawled {len(results)} URLs ({ok} ok) in {elapsed:.2f}s")
+    return dict(zip(crawlable, results))
+
+
+def run_claimed_job(job_payload, prefetched=None, heartbeat=None):
+    started = time.monotonic()
+    job_stats = None
+    try:
+        job_stats = process_job(job_payload, final_attempt=is_final_attempt(job_payload), prefetched=prefetched)
+    except Exception as e:
+        if heartbeat:
+            heartbeat.done(job_payload)
+        fail_job(job_payload, str(e))
+        status = "failed"
+    else:
+        if heartbeat:
+            heartbeat.done(job_payload)
+        ack_job(job_payload)
+        status = "completed"
+    record_duration(job_payload, time.monotonic() - started, status, job_stats)
+
+
+def run_pool(num_workers: int = INGEST_WORKERS):
+    """Run `num_workers` worker processes, restarting any that exit."""
+    # Initialize Qdrant collection once, before any worker starts
+    init_collection(COLLECTION_NAME, VECTOR_SIZE)
+
+    # spawn: each worker loads its own model instead of inheriting a forked torch runtime
+    ctx = multiprocessing.get_context("spawn")
+    procs = {}
+    started = {}  # slot -> monotonic start time of its current process
+    fast_exits = {}  # slot -> consecutive exits within WORKER_FAST_EXIT_SECONDS of starting
+    restart_at = {}  # slot -> earliest monotonic time the slot may be restarted
+    print(f"[Worker] Starting {num_workers} ingestion worker processes...")
+    while True:
+        now = time.monotonic()
+        for slot in range(num_workers):
+            proc = procs.get(slot)
+            if proc is not None and proc.is_alive():
+                continue
+            if proc is not None and slot not in restart_at:
+                # Back off when a worker keeps dying at startup (e.g. the model fails to load)
+                if now - started[slot] < WORKER_FAST_EXIT_SECONDS:
+                    fast_exits[slot] = fast_exits.get(slot, 0) + 1
+                else:
+                    fast_exits[slot] = 0
+                delay = min(2 ** fast_exits[slot] - 1, WORKER_RESTART_MAX_SECONDS)
+                restart_at[slot] = now + delay
+                print(f"[Worker] Worker process {proc.pid} exited ({proc.exitcode}); restarting in {delay:.0f}s")
+            if now < restart_at.get(slot, 0):
+                continue
+            restart_at.pop(slot, None)
+            # Not daemonic: workers start their own PDF extraction pools
+            proc = ctx.Process(target=worker_loop, name=f"ingest-worker-{slot}")
+            proc.start()
+            procs[slot] = proc
+            started[slot] = time.monotonic()
+        time.sleep(1)
 
 
 if __name__ == "__main__":
-    worker_loop()
\ No newline at end of file
+    run_pool()
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""Reliable Redis job queue for ingestion.
+
+Jobs move between these keys:
+
+- `ingest:jobs`        pending jobs (list, consumed from the left)
+- `ingest:processing`  claimed jobs (list) with claim heartbeats in `ingest:claims`
+- `ingest:delayed`     jobs waiting for a retry (sorted set scored by ready time)
+- `ingest:dead`        jobs that exhausted INGEST_MAX_ATTEMPTS (list)
+
+A job is claimed atomically with BLMOVE, so it is never only in a worker's
+memory. Claimed jobs whose heartbeat is older than the visibility timeout
+(e.g. the worker crashed) are put back on the queue by `run_maintenance`.
+"""
+import json
+import threading
+import time
+import uuid
+from app.config import (
+    get_redis,
+    INGEST_VISIBILITY_TIMEOUT_SECONDS,
+    INGEST_MAX_ATTEMPTS,
+    INGEST_RETRY_BACKOFF_SECONDS,
+)
+
+QUEUE_KEY = "ingest:jobs"
+PROCESSING_KEY = "ingest:processing"
+CLAIMS_KEY = "ingest:claims"
+DELAYED_KEY = "ingest:delayed"
+DEAD_KEY = "ingest:dead"
+STATS_KEY = "ingest:stats"
+DURATIONS_KEY = "ingest:durations"
+MAINTENANCE_LOCK_KEY = "ingest:maintenance"
+
+DURATIONS_KEPT = 200  # most recent per-job durations kept for /stats
+MAINTENANCE_LOCK_SECONDS = 10
+
+# Delete the lock only if it still holds our token; after a pass that outlived
+# the lock's expiry, the key may belong to another worker's pass
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def enqueue_job(job: dict):
+    get_redis().rpush(QUEUE_KEY, json.dumps(job))
+
+
+def claim_job(timeout: float):
+    """Block up to `timeout` seconds for a job and move it to the processing list."""
+    payload = get_redis().blmove(QUEUE_KEY, PROCESSING_KEY, timeout, "LEFT", "RIGHT")
+    if payload:
+        get_redis().hset(CLAIMS_KEY, payload, time.time())
+    return payload
+
+
+def claim_more_jobs(limit: int):
+    """Claim up to `limit` more jobs without blocking (for batched processing)."""
+    payloads = []
+    for _ in range(limit):
+        payload = get_redis().lmove(QUEUE_KEY, PROCESSING_KEY, "LEFT", "RIGHT")
+        if not payload:
+            break
+        get_redis().hset(CLAIMS_KEY, payload, time.time())
+        payloads.append(payload)
+    return payloads
+
+
+def ack_job(payload: str):
+    """Remove a finished job from the processing list."""
+    pipe = get_redis().pipeline()
+    pipe.lrem(PROCESSING_KEY, 1, payload)
+    pipe.hdel(CLAIMS_KEY, payload)
+    pipe.execute()
+
+
+def attempts_of(payload: str) -> int:
+    try:
+        return int(json.loads(payload).get("attempts", 0))
+    except Exception:
+        return 0
+
+
+def is_final_attempt(payload: str) -> bool:
+    return attempts_of(payload) + 1 >= INGEST_MAX_ATTEMPTS
+
+
+def _retry_or_bury(payload: str, error: str):
+    """Schedule a retry with exponential backoff, or dead-letter the job."""
+    job = json.loads(payload)
+    attempts = int(job.get("attempts", 0)) + 1
+    job["attempts"] = attempts
+    job["last_error"] = error[:500]
+
+    if attempts >= INGEST_MAX_ATTEMPTS:
+        job["failed_at"] = time.time()
+        get_redis().rpush(DEAD_KEY, json.dumps(job))
+        get_redis().hincrby(STATS_KEY, "dead", 1)
+        print(f"[Queue] Job {job.get('job_id')} moved to dead-letter list after {attempts} attempts")
+        return
+
+    delay = INGEST_RETRY_BACKOFF_SECONDS * (2 ** (attempts - 1))
+    get_redis().zadd(DELAYED_KEY, {json.dumps(job): time.time() + delay})
+    get_redis().hincrby(STATS_KEY, "retried", 1)
+    print(f"[Queue] Job {job.get('job_id')} retry {attempts}/{INGEST_MAX_ATTEMPTS - 1} in {delay:.0f}s")
+
+
+def fail_job(payload: str, error: str):
+    """Take a failed job off the processing list and retry or dead-letter it."""
+    _retry_or_bury(payload, error)
+    ack_job(payload)
+
+
+def record_duration(payload: str, seconds: float, status: str, job_stats: dict | None = None):
+    try:
+        job = json.loads(payload)
+    except Exception:
+        job = {}
+    entry = {"job_id": job.get("job_id"), "doc_id": job.get("doc_id"), "seconds": round(seconds, 3), "status": status}
+    if job_stats:
+        entry.update(job_stats)
+    pipe = get_redis().pipeline()
+    pipe.lpush(DURATIONS_KEY, json.dumps(entry))
+    pipe.ltrim(DURATIONS_KEY, 0, DURATIONS_KEPT - 1)
+    pipe.hincrby(STATS_KEY, status, 1)
+    if job_stats:
+        pipe.hincrby(STATS_KEY, "chunks_embedded", job_stats.get("chunks", 0) - job_stats.get("cache_hits", 0))
+        pipe.hincrby(STATS_KEY, "chunk_cache_hits", job_stats.get("cache_hits", 0))
+    pipe.execute()
+
+
+class ClaimHeartbeat:
+    """Context manager that keeps claimed jobs' heartbeats fresh while they run.
+
+    Call `done(payload)` before acking or failing a job so the heartbeat stops
+    re-creating its claim entry; entries of jobs still live on exit are removed.
+    """
+
+    def __init__(self, *payloads: str, interval: float = INGEST_VISIBILITY_TIMEOUT_SECONDS / 3):
+        self.live = set(payloads)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._lock = threading.Lock()  # a beat never overlaps `done`, so it can't undo an ack's hdel
+        self._thread = None
+
+    def done(self, payload: str):
+        with self._lock:
+            self.live.discard(payload)
+
+    def _beat(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self._lock:
+                    if self.live:
+                        now = time.time()
+                        get_redis().hset(CLAIMS_KEY, mapping={p: now for p in self.live})
+            except Exception as e:
+                print(f"[Queue] Heartbeat failed: {e}")
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if self.live:
+            try:
+                get_redis().hdel(CLAIMS_KEY, *self.live)
+            except Exception as e:
+                print(f"[Queue] Failed to clear claim heartbeats: {e}")
+        return False
+
+
+def run_maintenance():
+    """Promote due retries and re-queue stalled jobs.
+
+    Safe to call from every worker; a short Redis lock makes sure only one
+    of them does the work at a time.
+    """
+    token = uuid.uuid4().hex
+    if not get_redis().set(MAINTENANCE_LOCK_KEY, token, nx=True, ex=MAINTENANCE_LOCK_SECONDS):
+        return
+    try:
+        now = time.time()
+
+        # Retries whose backoff has elapsed go back on the queue
+        for payload in get_redis().zrangebyscore(DELAYED_KEY, 0, now):
+            if get_redis().zrem(DELAYED_KEY, payload):
+                get_redis().rpush(QUEUE_KEY, payload)
+
+        # Claimed jobs with a stale heartbeat: the worker died mid-job
+        for payload in get_redis().lrange(PROCESSING_KEY, 0, -1):
+            claimed_at = get_redis().hget(CLAIMS_KEY, payload)
+            if claimed_at is None:
+                # Claimed but the heartbeat was never written; start its clock now
+                get_redis().hsetnx(CLAIMS_KEY, payload, now)
+                continue
+            if now - float(claimed_at) < INGEST_VISIBILITY_TIMEOUT_SECONDS:
+                continue
+            if get_redis().lrem(PROCESSING_KEY, 1, payload):
+                get_redis().hdel(CLAIMS_KEY, payload)
+                get_redis().hincrby(STATS_KEY, "stalled", 1)
+                print(f"[Queue] Re-queueing stalled job (claimed {now - float(claimed_at):.0f}s ago)")
+                _retry_or_bury(payload, "visibility timeout exceeded")
+    finally:
+        get_redis().eval(_RELEASE_LOCK_SCRIPT, 1, MAINTENANCE_LOCK_KEY, token)
+
+
+def queue_stats() -> dict:
+    pipe = get_redis().pipeline()
+    pipe.llen(QUEUE_KEY)
+    pipe.llen(PROCESSING_KEY)
+    pipe.zcard(DELAYED_KEY)
+    pipe.llen(DEAD_KEY)
+    pipe.hgetall(STATS_KEY)
+    pipe.lrange(DURATIONS_KEY, 0, DURATIONS_KEPT - 1)
+    depth, in_flight, delayed, dead, counters, durations = pipe.execute()
+
+    recent = [json.loads(d) for d in durations]
+    seconds = sorted(d["seconds"] for d in recent)
+    return {
+        "queue_depth": depth,
+        "in_flight": in_flight,
+        "delayed": delayed,
+        "dead_letter": dead,
+        "counters": {k: int(v) for k, v in counters.items()},
+        "recent_jobs": recent[:20],
+        "duration_p50_seconds": seconds[len(seconds) // 2] if seconds else None,
+        "duration_p95_seconds": seconds[int(len(seconds) * 0.95)] if seconds else None,
+    }
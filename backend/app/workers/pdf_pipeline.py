@@ -0,0 +1,162 @@
+import collections
+import queue
+import threading
+import uuid
+from app.config import PDF_EMBED_BATCH_SIZE, PDF_PIPELINE_QUEUE_SIZE, QDRANT_UPSERT_PARALLELISM
+from app.utils.text_processing import iter_pdf_pages, chunk_page_text_with_offsets
+from app.utils.embeddings import embed_texts_cached
+from app.utils.vectorstore import submit_upserts
+
+_SENTINEL = object()
+
+
+class _PipelineAborted(Exception):
+    pass
+
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    """Blocking put that gives up once another stage has failed."""
+    while True:
+        if stop.is_set():
+            raise _PipelineAborted()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while True:
+        if stop.is_set():
+            raise _PipelineAborted()
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+
+def ingest_pdf_pipelined(file_path: str, doc_id: str, collection_name: str,
+                         embed_batch_size: int = PDF_EMBED_BATCH_SIZE,
+                         queue_size: int = PDF_PIPELINE_QUEUE_SIZE) -> dict:
+    """Extract, embed and upsert a PDF as three concurrent stages.
+
+    - extract: walks pages lazily and chunks each one with page/offset metadata
+    - embed: groups chunks across page boundaries into fixed-size batches and
+      encodes each batch in one call (chunks already in the embedding cache
+      are not re-encoded)
+    - upsert: sends every embedded batch to Qdrant as soon as it is ready, as
+      parallel fire-and-confirm requests (see `submit_upserts`); callers must
+      run `wait_for_document_points` before treating the data as indexed
+
+    Stages are connected by bounded queues, so at most `queue_size` pages and
+    batches are held in memory regardless of document length. The first
+    exception from any stage stops the others and is re-raised here.
+
+    Returns {"pages": ..., "chunks": ..., "batches": ..., "cache_hits": ...}.
+    """
+    page_q = queue.Queue(maxsize=queue_size)
+    batch_q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    stats = {"pages": 0, "chunks": 0, "batches": 0, "cache_hits": 0}
+
+    def extract_stage():
+        try:
+            for page_idx, page_text in enumerate(iter_pdf_pages(file_path), start=1):
+                stats["pages"] = page_idx
+                page_chunks = chunk_page_text_with_offsets(page_text)
+                if page_chunks:
+                    _put(page_q, (page_idx, page_chunks), stop)
+            _put(page_q, _SENTINEL, stop)
+        except _PipelineAborted:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    def embed_batch(pending):
+        embeddings, hits = embed_texts_cached([c["text"] for _, c in pending])
+        stats["cache_hits"] += hits
+        vector_ids = []
+        payloads = []
+        for page_idx, c in pending:
+            vid = str(uuid.uuid4())
+            vector_ids.append(vid)
+            payloads.append({
+                "chunk_id": vid,
+                "doc_id": doc_id,
+                "page_number": page_idx,
+                "text": c.get("text"),
+                "start_offset": c.get("start_offset"),
+                "end_offset": c.get("end_offset")
+            })
+        _put(batch_q, (embeddings, payloads, vector_ids), stop)
+
+    def embed_stage():
+        try:
+            pending = []
+            while True:
+                item = _get(page_q, stop)
+                if item is _SENTINEL:
+                    break
+                page_idx, page_chunks = item
+                for c in page_chunks:
+                    pending.append((page_idx, c))
+                    if len(pending) >= embed_batch_size:
+                        embed_batch(pending)
+                        pending = []
+            if pending:
+                embed_batch(pending)
+            _put(batch_q, _SENTINEL, stop)
+        except _PipelineAborted:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [
+        threading.Thread(target=extract_stage, name=f"pdf-extract-{doc_id}", daemon=True),
+        threading.Thread(target=embed_stage, name=f"pdf-embed-{doc_id}", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    # Upsert stage runs on the calling thread. Batches are sent without waiting
+    # for Qdrant to index them; only the number of requests in flight is capped.
+    in_flight = collections.deque()
+    try:
+        while True:
+            item = _get(batch_q, stop)
+            if item is _SENTINEL:
+                break
+            embeddings, payloads, vector_ids = item
+            in_flight.extend(submit_upserts(collection_name, embeddings, payloads, vector_ids))
+            while len(in_flight) > QDRANT_UPSERT_PARALLELISM * 2 or (in_flight and in_flight[0].done()):
+                in_flight.popleft().result()
+            stats["chunks"] += len(vector_ids)
+            stats["batches"] += 1
+        while in_flight:
+            in_flight.popleft().result()
+    except _PipelineAborted:
+        pass
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        for t in threads:
+            t.join()
+        # On failure, settle every outstanding upsert before returning, so the
+        # caller's cleanup delete can't be overtaken by a late write
+        for fut in in_flight:
+            fut.cancel()
+        for fut in in_flight:
+            if not fut.cancelled():
+                try:
+                    fut.result()
+                except Exception:
+                    pass
+
+    if errors:
+        raise errors[0]
+    return stats
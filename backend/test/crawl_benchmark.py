@@ -0,0 +1,74 @@
+import sys
+import time
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+
+# Make `app` importable when run as `python test/crawl_benchmark.py` from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.workers.crawler import crawl
+
+HOST = "127.0.0.1"
+NUM_URLS = 100
+NUM_HOSTS = 4  # distinct ports, so per-host limits apply as they would across sites
+LATENCY_SECONDS = 0.05  # simulated server/network latency per request
+PAGE = ("<html><head><title>Fixture</title></head><body><nav>menu</nav><main>"
+        + "<p>Benchmark fixture paragraph with some text.</p>" * 200
+        + "</main><footer>footer</footer></body></html>").encode("utf-8")
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(LATENCY_SECONDS)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.send_header("ETag", '"fixture-v1"')
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_servers():
+    servers = []
+    for _ in range(NUM_HOSTS):
+        server = ThreadingHTTPServer((HOST, 0), FixtureHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+def run_serial(urls):
+    for url in urls:
+        requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10).raise_for_status()
+
+
+def run_benchmark():
+    servers = start_servers()
+    ports = [s.server_address[1] for s in servers]
+    urls = [f"http://{HOST}:{ports[i % NUM_HOSTS]}/page/{i}" for i in range(NUM_URLS)]
+
+    start = time.time()
+    run_serial(urls)
+    serial = time.time() - start
+
+    start = time.time()
+    results = crawl(urls)
+    concurrent = time.time() - start
+    failed = [r for r in results if r.error]
+
+    print("\n📊 Crawl Benchmark")
+    print(f"URLs: {NUM_URLS} across {NUM_HOSTS} hosts, {LATENCY_SECONDS * 1000:.0f} ms latency each")
+    print(f"Serial requests.get: {serial:.2f}s ({NUM_URLS / serial:.1f} pages/s)")
+    print(f"Async crawler:       {concurrent:.2f}s ({NUM_URLS / concurrent:.1f} pages/s), {len(failed)} failed")
+    print(f"Speedup: {serial / concurrent:.1f}x")
+
+    for s in servers:
+        s.shutdown()
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,93 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+
+# Make `app` importable when run as `python test/embedding_benchmark.py` from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.utils.embeddings import load_model, EMBEDDING_DIMENSION
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "html"
+TOP_K = 10
+BATCH_SIZE = 32
+ROUNDS = 3  # encode passes per backend for throughput
+
+
+def load_corpus(path=None):
+    """One passage per non-empty line of `path`, or the text of the HTML fixtures."""
+    if path:
+        lines = Path(path).read_text(encoding="utf-8").splitlines()
+    else:
+        from app.utils.text_processing import extract_main_text
+        lines = []
+        for p in sorted(FIXTURES_DIR.glob("*.html")):
+            lines.extend(extract_main_text(p.read_text(encoding="utf-8")).splitlines())
+    return [line for line in lines if len(line.split()) >= 3]
+
+
+def export_quantized(output_dir, config="avx2"):
+    """Export all-MiniLM-L6-v2 to ONNX plus a dynamically int8-quantized copy in `output_dir`."""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    onnx_model = SentenceTransformer("all-MiniLM-L6-v2", backend="onnx")
+    onnx_model.save_pretrained(output_dir)
+    export_dynamic_quantized_onnx_model(onnx_model, config, output_dir)
+    print(f"💾 Exported to {output_dir} (set EMBEDDING_ONNX_MODEL_PATH={output_dir})")
+
+
+def encode(model, texts):
+    vectors = model.encode(texts, batch_size=BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def throughput(model, texts):
+    encode(model, texts[:BATCH_SIZE])  # warmup
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        encode(model, texts)
+    return len(texts) * ROUNDS / (time.perf_counter() - start)
+
+
+def recall_at_k(reference, candidate, k=TOP_K):
+    """Mean overlap of each passage's top-k neighbours under both models (self excluded)."""
+    k = min(k, len(reference) - 1)
+    ref_sims = reference @ reference.T
+    cand_sims = candidate @ candidate.T
+    np.fill_diagonal(ref_sims, -np.inf)
+    np.fill_diagonal(cand_sims, -np.inf)
+    ref_top = np.argsort(-ref_sims, axis=1)[:, :k]
+    cand_top = np.argsort(-cand_sims, axis=1)[:, :k]
+    return float(np.mean([len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)]))
+
+
+def run_benchmark(corpus_path=None):
+    texts = load_corpus(corpus_path)
+    print(f"\n📊 Embedding Benchmark ({len(texts)} passages)")
+
+    fp32 = load_model("torch")
+    int8 = load_model("onnx")
+
+    ref = encode(fp32, texts)
+    cand = encode(int8, texts)
+    assert ref.shape[1] == cand.shape[1] == EMBEDDING_DIMENSION
+
+    cosine = np.sum(ref * cand, axis=1)
+    print(f"Dimension: {cand.shape[1]}")
+    print(f"fp32 vs int8 cosine: mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+    print(f"Recall@{TOP_K} (int8 neighbours vs fp32): {recall_at_k(ref, cand):.4f}")
+
+    torch_rate = throughput(fp32, texts)
+    onnx_rate = throughput(int8, texts)
+    print(f"torch fp32: {torch_rate:8.1f} passages/s")
+    print(f"onnx int8:  {onnx_rate:8.1f} passages/s  ({onnx_rate / torch_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the fp32 and quantized ONNX embedding backends")
+    parser.add_argument("--corpus", help="text file with one passage per line (default: HTML fixtures)")
+    parser.add_argument("--export", metavar="DIR", help="export a quantized ONNX model to DIR and exit")
+    args = parser.parse_args()
+    if args.export:
+        export_quantized(args.export)
+    else:
+        run_benchmark(args.corpus)
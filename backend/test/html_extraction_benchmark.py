@@ -0,0 +1,60 @@
+import sys
+import time
+import difflib
+from pathlib import Path
+
+# Make `app` importable when run as `python test/html_extraction_benchmark.py` from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.utils.text_processing import extract_main_text
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "html"
+ENGINES = ["bs4", "lxml"]
+ROUNDS = 50  # passes over the corpus per engine
+
+
+def load_corpus(directory=FIXTURES_DIR):
+    """Saved HTML pages; drop more *.html files into the directory to widen the corpus."""
+    return {p.name: p.read_text(encoding="utf-8", errors="replace") for p in sorted(directory.glob("*.html"))}
+
+
+def time_engine(engine, pages):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for html in pages:
+            extract_main_text(html, engine=engine)
+    return time.perf_counter() - start
+
+
+def run_benchmark():
+    corpus = load_corpus()
+    if not corpus:
+        print(f"No fixtures found in {FIXTURES_DIR}")
+        return
+    pages = list(corpus.values())
+    total_mb = sum(len(h.encode("utf-8")) for h in pages) * ROUNDS / 1e6
+
+    print("\n📊 HTML Extraction Benchmark")
+    print(f"Corpus: {len(pages)} pages, {ROUNDS} rounds ({total_mb:.1f} MB processed per engine)")
+    timings = {}
+    for engine in ENGINES:
+        timings[engine] = time_engine(engine, pages)
+        elapsed = timings[engine]
+        print(f"{engine:>5}: {elapsed:.2f}s  {len(pages) * ROUNDS / elapsed:8.1f} pages/s  {total_mb / elapsed:6.1f} MB/s")
+    print(f"lxml speedup: {timings['bs4'] / timings['lxml']:.1f}x")
+
+    print("\n🔍 Output parity (bs4 vs lxml)")
+    identical = 0
+    for name, html in corpus.items():
+        reference = extract_main_text(html, engine="bs4")
+        candidate = extract_main_text(html, engine="lxml")
+        if reference == candidate:
+            identical += 1
+            print(f"✅ {name}")
+        else:
+            ratio = difflib.SequenceMatcher(None, reference, candidate).ratio()
+            print(f"❌ {name}: similarity {ratio:.3f}")
+    print(f"Identical: {identical}/{len(corpus)}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
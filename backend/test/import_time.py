@@ -0,0 +1,58 @@
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Run from anywhere; child interpreters are started in backend/ so `app` is importable
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+MODULE = "app.main"
+RUNS = 5  # fresh interpreters per measurement
+TOP_N = 15  # slowest modules to list from -X importtime
+
+
+def time_import(module=MODULE):
+    """Wall time of `import module` in a fresh interpreter (excludes interpreter startup)."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_modules(module=MODULE, top_n=TOP_N):
+    """Parse `python -X importtime` output into [(cumulative_us, module)], slowest first."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND_DIR, capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)", line)
+        if m:
+            rows.append((int(m.group(2)), m.group(4)))
+    return sorted(rows, reverse=True)[:top_n]
+
+
+def time_warmup():
+    """Time the deferred work that now happens in the startup warmup instead of at import."""
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app.utils.embeddings import warmup
+
+    start = time.perf_counter()
+    warmup()
+    return time.perf_counter() - start
+
+
+def run():
+    print(f"⏱️  Import time of {MODULE} ({RUNS} fresh interpreters)")
+    timings = sorted(time_import() for _ in range(RUNS))
+    print(f"min {timings[0]:.3f}s  median {timings[len(timings) // 2]:.3f}s  max {timings[-1]:.3f}s")
+
+    print("\n🐢 Slowest imports (cumulative)")
+    for us, name in slowest_modules():
+        print(f"{us / 1e6:8.3f}s  {name}")
+
+    if "--warmup" in sys.argv:
+        print(f"\n🔥 Model warmup: {time_warmup():.2f}s")
+
+
+if __name__ == "__main__":
+    run()
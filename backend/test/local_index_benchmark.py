@@ -0,0 +1,75 @@
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+# Make `app` importable when run as `python test/local_index_benchmark.py` from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.utils.local_store import LocalVectorStore
+
+NUM_VECTORS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+DIM = 384
+NUM_DOCS = 500
+NUM_QUERIES = 50
+TOP_K = 10
+APPEND_BATCH = 10_000
+COLLECTION = "bench"
+
+
+def build(root, dtype, vectors):
+    store = LocalVectorStore(root, dtype=dtype)
+    store.init_collection(COLLECTION, DIM)
+    start = time.perf_counter()
+    for i in range(0, len(vectors), APPEND_BATCH):
+        batch = vectors[i:i + APPEND_BATCH]
+        ids = [str(uuid.uuid4()) for _ in batch]
+        payloads = [{"doc_id": f"doc-{(i + j) % NUM_DOCS}", "text": f"chunk {i + j}"} for j in range(len(batch))]
+        store.upsert(COLLECTION, batch, payloads, ids)
+    return time.perf_counter() - start
+
+
+def run_benchmark():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(NUM_VECTORS, DIM)).astype(np.float32)
+    queries = vectors[rng.choice(NUM_VECTORS, NUM_QUERIES, replace=False)] + rng.normal(scale=0.5, size=(NUM_QUERIES, DIM)).astype(np.float32)
+
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = [set(np.argsort(-(normed @ q))[:TOP_K]) for q in queries]
+
+    print(f"📦 {NUM_VECTORS:,} x {DIM}-d vectors, {NUM_DOCS} docs, top-{TOP_K}")
+    for dtype in ("float32", "float16"):
+        with tempfile.TemporaryDirectory() as root:
+            build_s = build(root, dtype, vectors)
+
+            # Fresh store = what a restarted process sees; opening only maps the files
+            start = time.perf_counter()
+            store = LocalVectorStore(root, dtype=dtype)
+            store.search(COLLECTION, queries[0], TOP_K)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            latencies = []
+            recall = 0.0
+            for q, truth in zip(queries, exact):
+                start = time.perf_counter()
+                hits = store.search(COLLECTION, q, TOP_K)
+                latencies.append((time.perf_counter() - start) * 1000)
+                rows = {int(h.payload["text"].split()[1]) for h in hits}
+                recall += len(rows & truth) / TOP_K
+
+            start = time.perf_counter()
+            for q in queries:
+                store.search(COLLECTION, q, TOP_K, doc_ids=["doc-1", "doc-2"])
+            filtered_ms = (time.perf_counter() - start) * 1000 / NUM_QUERIES
+
+            size_mb = sum(f.stat().st_size for f in Path(root, COLLECTION).iterdir()) / 1e6
+            print(f"\n🔹 {dtype}")
+            print(f"build {build_s:.1f}s  on disk {size_mb:.0f} MB  open + first search {open_ms:.0f}ms")
+            print(f"search p50 {np.percentile(latencies, 50):.1f}ms  p95 {np.percentile(latencies, 95):.1f}ms  "
+                  f"doc-filtered {filtered_ms:.1f}ms  recall@{TOP_K} {recall / NUM_QUERIES:.3f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Make `app` importable when run from backend/ or the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import app.routes.query as query_routes
+
+PDF_PAYLOAD = {"doc_id": "doc-pdf", "page_number": 3, "text": "The AB-1234 pump is rated for 40 bar.", "start_offset": 0, "end_offset": 37}
+
+
+def make_client(monkeypatch, hits, prompts):
+    async def fake_embed(text):
+        return [0.0, 0.0, 0.0]
+
+    def fake_generate(messages):
+        prompts.append(messages[0]["content"])
+        return "answer"
+
+    monkeypatch.setattr(query_routes, "embed_query_async", fake_embed)
+    monkeypatch.setattr(query_routes, "search_vectors", lambda *a, **k: hits)
+    monkeypatch.setattr(query_routes, "generate_response", fake_generate)
+    monkeypatch.setattr(query_routes, "checked_doc_ids", lambda doc_ids: doc_ids or None)
+    app = FastAPI()
+    app.include_router(query_routes.router)
+    return TestClient(app)
+
+
+def test_query_uses_pdf_chunk_text(monkeypatch):
+    prompts = []
+    client = make_client(monkeypatch, [SimpleNamespace(payload=PDF_PAYLOAD)], prompts)
+
+    res = client.post("/query", json={"query": "What is the AB-1234 rated for?", "doc_ids": ["doc-pdf"]})
+
+    assert res.status_code == 200
+    assert "The AB-1234 pump is rated for 40 bar." in prompts[0]
+
+
+def test_build_prompt_prefers_text_then_text_snippet():
+    hits = [
+        SimpleNamespace(payload=PDF_PAYLOAD),
+        SimpleNamespace(payload={"url": "https://example.com", "text_snippet": "URL chunk text"}),
+    ]
+    prompt, sources = query_routes.build_prompt("q", hits)
+    assert "40 bar" in prompt
+    assert "URL chunk text" in prompt
+    assert "https://example.com" in sources
+
+
+def test_query_batch_uses_pdf_chunk_text(monkeypatch):
+    prompts = []
+    client = make_client(monkeypatch, [], prompts)
+    monkeypatch.setattr(query_routes, "embed_queries", lambda queries: [[0.0, 0.0, 0.0] for _ in queries])
+    monkeypatch.setattr(
+        query_routes, "search_vectors_batch",
+        lambda collection, vectors, limit, doc_ids: [[SimpleNamespace(payload=PDF_PAYLOAD)] for _ in vectors],
+    )
+
+    res = client.post("/query/batch", json={"queries": ["first?", "second?"], "doc_ids": ["doc-pdf"]})
+
+    assert res.status_code == 200
+    lines = [line for line in res.text.splitlines() if line]
+    assert len(lines) == 2
+    assert len(prompts) == 2
+    assert all("The AB-1234 pump is rated for 40 bar." in p for p in prompts)
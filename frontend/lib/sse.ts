@@ -9,6 +9,9 @@ export class ConversationSse {
   private handler: EventHandler;
   private reconnectDelay = 1000;
   private closed = false;
+  // Id of the last event received; a manual reconnect resumes after it
+  // instead of replaying the turn from the start
+  private lastEventId: string | null = null;
 
   constructor(conversationId: string, handler: EventHandler) {
     const base = (API_BASE || "").replace(/\/$/, "");
@@ -20,10 +23,14 @@ export class ConversationSse {
   private connect() {
     this.closed = false;
   // Use non-credentialed EventSource for prototype (server uses Access-Control-Allow-Origin: *).
-  this.es = new EventSource(this.url);
+  const url = this.lastEventId
+    ? `${this.url}?last_event_id=${encodeURIComponent(this.lastEventId)}`
+    : this.url;
+  this.es = new EventSource(url);
 
     // Generic onmessage used as fallback
     this.es.onmessage = (e) => {
+      if (e.lastEventId) this.lastEventId = e.lastEventId;
       try {
         const payload = JSON.parse(e.data);
         this.handler(payload as SseEvent);
@@ -47,6 +54,7 @@ export class ConversationSse {
 
     eventTypes.forEach((t) => {
       this.es!.addEventListener(t, (e: MessageEvent) => {
+        if (e.lastEventId) this.lastEventId = e.lastEventId;
         try {
           const data = JSON.parse(e.data);
           this.handler({ type: t, data });